@@ -2,12 +2,23 @@ from flask import Flask
 from flask.typing import ResponseReturnValue
 from werkzeug.exceptions import HTTPException
 
+from app.core.auth.importer import import_users_command
+from app.core.auth.revoke import revocations
+from app.core.cache import Manager, RedisStorage, VersionStore
+from app.core.cache.storage import LocalStorage
 from app.core.exception import APIException
 from app.core.log import Logger
-from app.core.model import db
+from app.core.model import Counter, db, query_cache, snowflake
+from app.core.model.snowflake import WorkerIdLease
+from app.core.ratelimit import limiter
+from app.core.redis import redis_client
+from app.core.response.cache import response_cache
+from app.core.response.compress import compressor
+from app.core.response.json import JSONProvider
 from config import config
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
 
 # 配置项
 app.config.from_object(config)
@@ -15,6 +26,20 @@ app.config.from_object(config)
 # 插件
 Logger(app)
 db.init_app(app)
+limiter.init_app(app, redis_client)
+revocations.init_app(app, redis_client)
+compressor.init_app(app)
+
+# 缓存后端, 所有 Manager 共享
+cache = Manager()
+cache.register_storage("local", LocalStorage())
+cache.register_storage("redis", RedisStorage(redis_client))
+query_cache.init_app(app, VersionStore(redis_client))
+response_cache.init_app(app, VersionStore(redis_client, prefix="response"))
+Counter.init(redis_client)
+# 开启 __snowflake__ 的 model 首次创建实例时才租用 worker id, 租约失效后重新租用
+worker_id_lease = WorkerIdLease(redis_client)
+snowflake.init(worker_id_lease.acquire, worker_id_lease.is_valid)
 
 
 def error_handler_http(error: HTTPException) -> ResponseReturnValue:
@@ -22,6 +47,11 @@ def error_handler_http(error: HTTPException) -> ResponseReturnValue:
 
 
 app.register_error_handler(HTTPException, error_handler_http)
+# 预先编码异常的默认响应体
+APIException.init_app(app)
+
+# 命令行
+app.cli.add_command(import_users_command)
 
 
 # 路由
@@ -1,6 +1,7 @@
 from .auth import Auth, current_user
 from .model import User
 from .permission import admin_required, login_required
+from .principal import Principal
 
 __all__ = (
     "Auth",
@@ -8,4 +9,5 @@ __all__ = (
     "admin_required",
     "login_required",
     "User",
+    "Principal",
 )
@@ -4,7 +4,10 @@
 - JWT_SECRET_KEY: 密钥[必须],或设置 SECRET_KEY
 - JWT_ALGORITHM: 算法
 - JWT_ACCESS_TOKEN_EXPIRES: 过期时间
-- JWT_TOKEN_URL: 获取 token 的路由.
+- JWT_TOKEN_URL: 获取 token 的路由
+- JWT_TOKEN_CACHE_SIZE: 已验证 token 的缓存数量, 为 0 时不缓存
+- JWT_LOGIN_RATE_LIMIT: 每个 IP 登录频率限制, 为 None 时不限制
+- JWT_LOGOUT_URL: 退出登录(吊销当前 token)的路由.
 
 使用:
 ```python
@@ -14,29 +17,77 @@ from app.user.model import User
 # 注册
 auth = Auth(app)
 
-# 当前用户(view 函数中使用)
-user = current_user.get()
+# 当前用户身份(view 函数中使用), 需要完整 User 时使用 principal.load_user()
+principal = current_user.get()
 ```
 """
 import datetime
-from contextvars import ContextVar
+import hashlib
+import time
+import uuid
+from collections.abc import Callable
+from contextvars import ContextVar, Token
 from dataclasses import asdict, dataclass
 from datetime import timedelta
 from typing import Any
 
 import jwt
-from flask import Flask, Response, request
+from flask import Flask, Response, g, request
+from theine.thenie import Cache
 
-from app.core.exception import ParameterException, Unauthorized
+from app.core.exception import ParameterException, Success, Unauthorized
+from app.core.ratelimit import by_ip, limiter
 from app.core.schema import validate
 
+from .index import permission_index
 from .model import User
+from .password import password_hasher
+from .principal import Principal, PrincipalNode
+from .revoke import revocations
 from .schema import LoginScheme
 
-current_user: ContextVar[User | None] = ContextVar("user")
-""" 当前用户
->>> user = current_user.get()
-还可以使用 proxy 封装以便直接使用 current_user
+
+class _Lazy:
+    __slots__ = ("resolver", "resolved", "value")
+
+    def __init__(self, resolver: Callable[[], Principal | None]) -> None:
+        self.resolver = resolver
+        self.resolved = False
+        self.value: Principal | None = None
+
+    def get(self) -> Principal | None:
+        if not self.resolved:
+            self.value = self.resolver()
+            self.resolved = True
+        return self.value
+
+
+class CurrentUser:
+    """惰性解析的当前用户, 接口与 ContextVar 相同.
+
+    请求开始时只保存解析函数, 第一次 `get()` 时才解析 token 并加载 Principal, 不读取当前用户的请求没有认证开销.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._var: ContextVar[Principal | _Lazy | None] = ContextVar(name)
+
+    def get(self) -> Principal | None:
+        value = self._var.get()
+        return value.get() if isinstance(value, _Lazy) else value
+
+    def set(self, value: Principal | None) -> Token[Principal | _Lazy | None]:
+        return self._var.set(value)
+
+    def set_lazy(self, resolver: Callable[[], Principal | None]) -> Token[Principal | _Lazy | None]:
+        return self._var.set(_Lazy(resolver))
+
+    def reset(self, token: Token[Principal | _Lazy | None]) -> None:
+        self._var.reset(token)
+
+
+current_user = CurrentUser("user")
+""" 当前用户身份
+>>> principal = current_user.get()
 """
 
 
@@ -44,7 +95,8 @@ current_user: ContextVar[User | None] = ContextVar("user")
 class JWTPayload:
     sub: dict[str, str] | None = None
     exp: int | None = None
-    iat: int | None = None
+    iat: float | None = None  # 毫秒精度, 用于判断是否在强制下线之前签发
+    jti: str | None = None  # token id, 用于吊销
 
 
 def encode_token(
@@ -56,12 +108,13 @@ def encode_token(
     expires = expires or timedelta(minutes=120)
     algorithm = algorithm or "HS256"
     now = datetime.datetime.now(tz=datetime.UTC)
-    iat = int(now.timestamp())
+    iat = int(now.timestamp() * 1000) / 1000
     exp = int((now + expires).timestamp())
     payload = JWTPayload(
         sub=data,
         iat=iat,
         exp=exp,
+        jti=uuid.uuid4().hex,
     )
     return jwt.encode(  # type: ignore 严格模式下参数部分类型未知错误
         payload=asdict(payload),
@@ -75,13 +128,21 @@ def decode_token(
     secret_key: str,
     algorithm: str | None = "HS256",
 ) -> dict[str, Any]:
+    return verify_token(token, secret_key, algorithm)["sub"]
+
+
+def verify_token(
+    token: str,
+    secret_key: str,
+    algorithm: str | None = "HS256",
+) -> dict[str, Any]:
+    """验证签名和过期时间, 返回完整的 payload."""
     try:
-        payload = jwt.decode(
+        return jwt.decode(
             jwt=token,
             key=secret_key,
             algorithms=[algorithm] if algorithm else None,
         )
-        return payload.get("sub")
     except jwt.ExpiredSignatureError:
         # 过期
         raise Unauthorized(message="Token has expired") from None
@@ -90,8 +151,52 @@ def decode_token(
         raise Unauthorized(message="Token is invalid") from None
 
 
+class TokenCache:
+    """已验证 token 的进程内缓存, 同一个 token 在每个 worker 中只验证一次签名.
+
+    key 为 token 的 sha256, 不在内存中保存 token 原文; 缓存在 token 过期时失效.
+    gevent 下同一 worker 的所有协程共享.
+    """
+
+    def __init__(self, size: int = 10000) -> None:
+        self.client = Cache("tlfu", size)
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        payload: dict[str, Any] | None = self.client.get(self.key(token))
+        # 淘汰过期 key 有延迟, 这里再检查一次
+        if payload is None or payload["exp"] <= time.time():
+            return None
+        return payload
+
+    def set(self, token: str, payload: dict[str, Any]) -> None:
+        ttl = payload["exp"] - time.time()
+        if ttl > 0:
+            self.client.set(self.key(token), payload, datetime.timedelta(seconds=ttl))
+
+
+def verify_access_token(token: str, app: Flask, token_cache: TokenCache | None = None) -> dict[str, Any]:
+    """使用 app 的 JWT 配置验证 token 并检查是否已被吊销, HTTP 和 websocket 认证共用."""
+    payload = token_cache.get(token) if token_cache is not None else None
+    if payload is None:
+        payload = verify_token(
+            token=token,
+            secret_key=app.config.get("JWT_SECRET_KEY"),  # type: ignore
+            algorithm=app.config.get("JWT_ALGORITHM"),
+        )
+        if token_cache is not None:
+            token_cache.set(token, payload)
+    if revocations.is_revoked(payload):
+        raise Unauthorized(message="Token has been revoked")
+    return payload
+
+
 class Auth:
     user: type[User] = User
+    token_cache: TokenCache | None = None
 
     def __init__(
         self,
@@ -103,30 +208,41 @@ class Auth:
     def init_app(self, app: Flask) -> None:
         self.app = app
         self.config(app)
-        # 注册获取 token (登录)的路由
-        app.add_url_rule(
-            self.app.config.get("JWT_TOKEN_URL", "/token"), view_func=validate(self.login), methods=["POST"]
-        )
+        PrincipalNode.init_app(app)
+        permission_index.init_app(app)
+        password_hasher.init_app(app)
+        # 注册获取 token (登录)的路由, 限制频率避免暴力破解和消耗 CPU 计算密码 hash
+        login = validate(self.login)
+        if app.config["JWT_LOGIN_RATE_LIMIT"]:
+            login = limiter.limit(app.config["JWT_LOGIN_RATE_LIMIT"], key=by_ip, scope="login")(login)
+        app.add_url_rule(self.app.config.get("JWT_TOKEN_URL", "/token"), view_func=login, methods=["POST"])
+        app.add_url_rule(app.config["JWT_LOGOUT_URL"], view_func=self.logout, methods=["POST"])
         app.before_request(self.before_request)
         app.after_request(self.after_request)
+        if app.config["JWT_TOKEN_CACHE_SIZE"] > 0:
+            self.token_cache = TokenCache(app.config["JWT_TOKEN_CACHE_SIZE"])
 
-    def config(self, app: Flask) -> None:
+    @staticmethod
+    def config(app: Flask) -> None:
         """需要配置的参数."""
         app.config.setdefault("JWT_TOKEN_URL", "/token")
         app.config.setdefault("JWT_SECRET_KEY", app.config.get("SECRET_KEY", None))
         app.config.setdefault("JWT_ALGORITHM", "HS256")
         app.config.setdefault("JWT_ACCESS_TOKEN_EXPIRES", datetime.timedelta(minutes=120))
+        app.config.setdefault("JWT_TOKEN_CACHE_SIZE", 10000)
+        app.config.setdefault("JWT_LOGIN_RATE_LIMIT", "10/minute")
+        app.config.setdefault("JWT_LOGOUT_URL", "/logout")
         if app.config.get("JWT_SECRET_KEY") is None:
             raise ValueError("JWT_SECRET_KEY must be set")
 
     def before_request(self) -> None:
-        user = self.identify(silent=True)
-        # user 为 None 时也设置,以便在视图函数中使用
-        self.current_user_token = current_user.set(user)
+        # 未登录时解析为 None, 以便在视图函数中使用
+        g.current_user_token = current_user.set_lazy(lambda: self.identify(silent=True))
 
     def after_request(self, response: Response) -> Response:
-        if hasattr(self, "current_user_token") and self.current_user_token:
-            current_user.reset(self.current_user_token)
+        token = g.pop("current_user_token", None)
+        if token is not None:
+            current_user.reset(token)
         return response
 
     @staticmethod
@@ -139,23 +255,36 @@ class Auth:
             raise Unauthorized()
         return authorization[7:]
 
-    def identify(self, silent: bool = False) -> User | None:
-        """Returns the current user."""
+    def identify(self, silent: bool = False) -> Principal | None:
+        """Returns the current user's principal."""
         token_from_header = self.get_bearer_token(silent)
         if token_from_header is None:
             return None
-        data = decode_token(
-            token=token_from_header,
-            secret_key=self.app.config.get("JWT_SECRET_KEY"),  # type: ignore
-            algorithm=self.app.config.get("JWT_ALGORITHM"),
-        )
-        user = self.user.get_by_id(data["user_id"])
+        data = self.verify_token(token_from_header)["sub"]
+        user = PrincipalNode.get(data["user_id"])
         if user is None or user.is_deleted:
             if silent:
                 return None
             raise ParameterException(message="Invalid user")
         return user
 
+    def verify_token(self, token: str) -> dict[str, Any]:
+        """验证 token 并返回 payload, 优先使用已验证的缓存. 缓存的 token 同样检查是否已被吊销."""
+        return verify_access_token(token, self.app, self.token_cache)
+
+    def logout(self) -> Success:
+        """吊销当前 token."""
+        payload = self.verify_token(self.get_bearer_token())  # type: ignore
+        if not payload.get("jti"):
+            raise ParameterException(message="Token can not be revoked")
+        revocations.revoke(payload["jti"], payload["exp"])
+        return Success()
+
+    def revoke_user(self, user_id: int) -> None:
+        """强制用户下线: 吊销该用户已签发的所有 token."""
+        expires: timedelta = self.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+        revocations.revoke_user(user_id, int(expires.total_seconds()))
+
     def validate_credential(self, username: str, password: str, scope: str = "") -> dict[str, str]:
         """Authenticates the user and returns an access token."""
         scopes = scope.split()  # type: ignore # noqa
@@ -0,0 +1,235 @@
+"""批量导入用户.
+
+按批读取 CSV/NDJSON(字段: username, mobile, password, 以及 `ImportProfileSchema` 中的资料字段), 每批依次:
+校验格式 -> 按唯一索引(mobile、username)批量去重 -> 进程池中计算密码 hash -> 批量 INSERT.
+单行错误(包括无法解析的行)记录到报告中, 不会中断导入:
+
+```shell
+flask --app app.app import-users users.csv --errors errors.ndjson
+```
+"""
+import csv
+import json
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import IO, Any
+
+import click
+import pydantic
+import structlog
+from sqlalchemy import insert, inspect, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app.core.model import db
+from app.core.schema.common import validate_mobile, validate_password, validate_username
+
+from .model import User
+from .password import password_hasher
+from .schema import ImportProfileSchema
+
+import_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.import")
+
+# 除账号字段外只允许设置资料字段, 其余字段(role_id、status 等)忽略
+IMPORT_FIELDS = set(ImportProfileSchema.__fields__)
+VALIDATORS = {"username": validate_username, "mobile": validate_mobile, "password": validate_password}
+
+
+@dataclass(slots=True)
+class RowError:
+    line: int
+    field: str
+    message: str
+
+
+@dataclass(slots=True)
+class ImportReport:
+    total: int = 0
+    inserted: int = 0
+    duration: float = 0
+    errors: list[RowError] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """每秒处理的行数."""
+        return self.total / self.duration if self.duration else 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "failed": len(self.errors),
+            "duration": round(self.duration, 3),
+            "throughput": round(self.throughput, 1),
+        }
+
+
+Row = tuple[int, dict[str, Any]]
+RawRow = tuple[int, dict[str, Any] | RowError]
+
+
+def read_rows(file: IO[str], fmt: str) -> Iterator[RawRow]:
+    """逐行读取, 返回 (行号, 数据), 无法解析的行返回 (行号, RowError)."""
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            yield line, RowError(line, "", f"JSON 格式错误: {e.msg}")
+            continue
+        if not isinstance(data, dict):
+            yield line, RowError(line, "", "每行必须是 JSON 对象")
+            continue
+        yield line, data
+
+
+def chunked(rows: Iterable[RawRow], size: int) -> Iterator[list[RawRow]]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class UserImporter:
+    def __init__(self, chunk_size: int = 1000, workers: int | None = None) -> None:
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.report = ImportReport()
+        # 文件内部去重
+        self.seen_mobiles: set[str] = set()
+        self.seen_usernames: set[str] = set()
+
+    def run(self, rows: Iterable[RawRow]) -> ImportReport:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(self.workers) as pool:
+            for chunk in chunked(rows, self.chunk_size):
+                self.report.total += len(chunk)
+                valid = self.dedupe(self.validate(chunk))
+                passwords = [row.pop("password") for _, row in valid]
+                # 每个进程一次处理一段, 减少进程间通信次数
+                hashes = pool.map(
+                    partial(generate_password_hash, method=password_hasher.method),
+                    passwords,
+                    chunksize=max(len(passwords) // 32, 1),
+                )
+                self.insert(
+                    [(line, {**row, "password": hashed}) for (line, row), hashed in zip(valid, hashes, strict=True)]
+                )
+                self.report.duration = time.perf_counter() - start
+                import_logger.info("import progress", **self.report.to_dict())
+        return self.report
+
+    def validate(self, chunk: list[RawRow]) -> list[Row]:
+        valid = []
+        for line, raw in chunk:
+            if isinstance(raw, RowError):
+                self.report.errors.append(raw)
+                continue
+            row: dict[str, Any] = {}
+            try:
+                for name, validator in VALIDATORS.items():
+                    row[name] = validator(str(raw.get(name) or ""))
+            except ValueError as e:
+                self.report.errors.append(RowError(line, name, str(e)))
+                continue
+            # CSV 中的值都是字符串, 按 schema 转换类型; 空值视为未设置, 使用默认值
+            profile = {key: value for key, value in raw.items() if key in IMPORT_FIELDS and value not in ("", None)}
+            try:
+                row.update(ImportProfileSchema.parse_obj(profile).dict(exclude_none=True))
+            except pydantic.ValidationError as e:
+                error = e.errors()[0]
+                self.report.errors.append(RowError(line, ".".join(map(str, error["loc"])), error["msg"]))
+                continue
+            valid.append((line, row))
+        return valid
+
+    def dedupe(self, rows: list[Row]) -> list[Row]:
+        """按唯一索引去重: 每批一次 IN 查询, 以及与文件中之前的行比较."""
+        if not rows:
+            return rows
+        mobiles = [row["mobile"] for _, row in rows]
+        usernames = [row["username"] for _, row in rows]
+        with db.connect() as _session:
+            existed_mobiles = set(_session.scalars(select(User.mobile).where(User.mobile.in_(mobiles))))
+            existed_usernames = set(
+                _session.scalars(select(User.username).where(User.username.in_(usernames), User.is_deleted == 0))
+            )
+        result = []
+        for line, row in rows:
+            if row["mobile"] in existed_mobiles or row["mobile"] in self.seen_mobiles:
+                self.report.errors.append(RowError(line, "mobile", "手机号已存在"))
+            elif row["username"] in existed_usernames or row["username"] in self.seen_usernames:
+                self.report.errors.append(RowError(line, "username", "用户名已存在"))
+            else:
+                self.seen_mobiles.add(row["mobile"])
+                self.seen_usernames.add(row["username"])
+                result.append((line, row))
+        return result
+
+    def insert(self, rows: list[Row]) -> None:
+        """批量 INSERT, 与并发写入冲突时逐行重试以找出冲突的行."""
+        if not rows:
+            return
+        values = [self.to_values(row) for _, row in rows]
+        try:
+            with db.connect() as _session:
+                _session.execute(insert(User), values)
+                _session.commit()
+            self.report.inserted += len(rows)
+            return
+        except IntegrityError:
+            pass
+        for (line, _), value in zip(rows, values, strict=True):
+            try:
+                with db.connect() as _session:
+                    _session.execute(insert(User), [value])
+                    _session.commit()
+                self.report.inserted += 1
+            except IntegrityError as e:
+                self.report.errors.append(RowError(line, "", str(e.orig)))
+
+    @staticmethod
+    def to_values(row: dict[str, Any]) -> dict[str, Any]:
+        """通过 User 构造函数补全默认值(以及 Snowflake id), 与 `User(...).save()` 写入的数据一致."""
+        password = row.pop("password")
+        user = User(**row)
+        user.password = password
+        return {
+            attr.key: getattr(user, attr.key)
+            for attr in inspect(User).column_attrs
+            if attr.key != "id" or user.id is not None
+        }
+
+
+@click.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None, help="默认按扩展名判断")
+@click.option("--chunk-size", default=1000, show_default=True)
+@click.option("--workers", type=int, default=None, help="计算密码 hash 的进程数, 默认为 CPU 数")
+@click.option("--errors", "errors_path", type=click.Path(dir_okay=False, path_type=Path), help="错误行写入该文件")
+def import_users_command(
+    path: Path,
+    fmt: str | None,
+    chunk_size: int,
+    workers: int | None,
+    errors_path: Path | None,
+) -> None:
+    """从 CSV/NDJSON 批量导入用户."""
+    fmt = fmt or ("csv" if path.suffix == ".csv" else "ndjson")
+    with path.open(encoding="utf-8", newline="") as file:
+        report = UserImporter(chunk_size, workers).run(read_rows(file, fmt))
+    if errors_path is not None:
+        with errors_path.open("w", encoding="utf-8") as file:
+            for error in sorted(report.errors, key=lambda error: error.line):
+                file.write(json.dumps({"line": error.line, "field": error.field, "message": error.message}) + "\n")
+    click.echo(json.dumps(report.to_dict()))
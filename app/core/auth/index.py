@@ -0,0 +1,83 @@
+"""角色权限索引.
+
+每个 `PermissionMeta` 按 (module, auth) 排序后分配一个位, 每个角色的权限保存为一个整数位图,
+权限检查只需要一次位运算, 不需要查询数据库.
+
+位图缓存在进程内. `permission`/`role_permission` 表通过 session 提交修改后, 查询缓存会递增这两张表的版本号
+(见 `app.core.model.cache`), 索引每隔 PERMISSION_INDEX_CHECK_INTERVAL 秒检查一次版本号, 变化时重新加载.
+"""
+import time
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from flask import Flask
+from sqlalchemy import select
+
+from app.core.model import db, query_cache
+
+from .model import ADMIN_ROLE_ID, Permission, RolePermission
+
+if TYPE_CHECKING:
+    from .permission import PermissionMeta
+
+TABLES = [Permission.__tablename__, RolePermission.__tablename__]
+
+
+class PermissionIndex:
+    def __init__(self, check_interval: float = 5) -> None:
+        self.check_interval = check_interval
+        self.bits: dict[tuple[str, str], int] = {}
+        self.role_bits: dict[int, int] = {}
+        self.versions: list[int] | None = None
+        self.checked_at = 0.0
+        self._lock = Lock()
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault("PERMISSION_INDEX_CHECK_INTERVAL", 5)
+        self.check_interval = app.config["PERMISSION_INDEX_CHECK_INTERVAL"]
+
+    def build_bits(self) -> dict[tuple[str, str], int]:
+        # 延迟导入: permission 模块依赖 auth, auth 依赖本模块
+        from .permission import permission_metas
+
+        # 按名称排序, 所有进程分配的位相同
+        keys = sorted({(meta.module, meta.auth) for meta in permission_metas})
+        return {key: 1 << index for index, key in enumerate(keys)}
+
+    def load(self, versions: list[int]) -> None:
+        bits = self.build_bits()
+        statement = select(RolePermission.role_id, Permission.module, Permission.name).join(
+            Permission, Permission.id == RolePermission.permission_id
+        )
+        role_bits: dict[int, int] = {}
+        with db.connect() as _session:
+            for role_id, module, name in _session.execute(statement):
+                # 数据库中有但代码中已经不存在的权限忽略
+                role_bits[role_id] = role_bits.get(role_id, 0) | bits.get((module, name), 0)
+        self.bits, self.role_bits, self.versions = bits, role_bits, versions
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and self.versions is not None and now - self.checked_at < self.check_interval:
+            return
+        with self._lock:
+            if not force and self.versions is not None and now - self.checked_at < self.check_interval:
+                return
+            versions = query_cache.versions.get_many(TABLES)
+            if force or versions != self.versions:
+                self.load(versions)
+            self.checked_at = now
+
+    def has_permission(self, role_id: int, meta: "PermissionMeta") -> bool:
+        if role_id == ADMIN_ROLE_ID:
+            return True
+        self.refresh()
+        bit = self.bits.get((meta.module, meta.auth))
+        if bit is None:
+            # 索引建立后才声明的权限
+            self.refresh(force=True)
+            bit = self.bits.get((meta.module, meta.auth), 0)
+        return bool(self.role_bits.get(role_id, 0) & bit)
+
+
+permission_index = PermissionIndex()
@@ -1,15 +1,18 @@
 from datetime import date, datetime
 from typing import TYPE_CHECKING, Self
 
-from sqlalchemy import BigInteger, Date, Index, SmallInteger, String, or_, select
+from sqlalchemy import BigInteger, Date, Index, Integer, SmallInteger, String, or_, select
 from sqlalchemy.orm import Mapped, mapped_column
-from werkzeug.security import check_password_hash, generate_password_hash
 
-from app.core.model import BaseModel, T_create_time, T_update_time, session
+from app.core.model import BaseModel, Counter, T_create_time, T_update_time, session
+
+from .password import password_hasher
 
 if TYPE_CHECKING:
     from .permission import PermissionMeta
 
+ADMIN_ROLE_ID = 1  # 管理员角色 id
+
 
 class User(BaseModel):
     username: Mapped[str] = mapped_column(String(32), index=True)
@@ -31,17 +34,24 @@ class User(BaseModel):
     github: Mapped[str] = mapped_column(default=None)
     create_time: Mapped[T_create_time] = mapped_column(default_factory=datetime.utcnow)
     update_time: Mapped[T_update_time] = mapped_column(default_factory=datetime.utcnow)
+    # 计数字段只通过 article_counter/like_counter 修改, 读取时使用 counter.get(user)
+    article_count: Mapped[int] = mapped_column(Integer, default=0, comment="发文数量")
+    like_count: Mapped[int] = mapped_column(Integer, default=0, comment="累计点赞数")
 
     __table_args__ = (Index("username_del", "username", "is_deleted", unique=True),)
 
     def check_password(self, data: str) -> bool:
-        return check_password_hash(self.password, data)  # type: ignore
+        return password_hasher.verify(self.password, data)
 
     @classmethod
     def validate_credential(cls, username: str, password: str) -> Self | None:
         """验证用户和密码是否正确."""
         one = cls.get_by_attr(or_(cls.username == username, cls.mobile == username), cls.is_deleted == 0)
         if one and one.check_password(password):
+            if password_hasher.needs_rehash(one.password):
+                # hash 参数变化后, 登录成功时使用新参数重新 hash
+                one.set_password(password)
+                one.save()
             return one
         return None
 
@@ -51,35 +61,21 @@ class User(BaseModel):
         return session.get(cls, int(value))
 
     def is_admin(self) -> bool:
-        with session:
-            statement = select(Role).where(Role.id == self.role_id)
-            role = session.scalar(statement)
-            if role and role.id == 1:  # NOTE: Admin id is 1
-                return True
-            return False
+        return self.role_id == ADMIN_ROLE_ID
 
     def has_permission(self, meta: "PermissionMeta") -> bool:
-        if self.is_admin():
-            return True
-        with session:
-            # 查找用户所属分组 id
-            role_statement = select(Role).where(Role.id == self.role_id)
-            role = session.scalar(role_statement)
-            if role is None:
-                return False
-            # 查找分组的所有权限 名称
-            permission_statement = (
-                select(Permission.name, Permission.module)
-                .join(RolePermission, Permission.id == RolePermission.permission_id)
-                .where(RolePermission.role_id == role.id)
-            )
-
-            existed_permissions = session.scalars(permission_statement).all()  # 用户拥有的权限
-            return any(item.name == meta.auth and item.module == meta.module for item in existed_permissions)
+        # 延迟导入: index 模块依赖本模块
+        from .index import permission_index
+
+        return permission_index.has_permission(self.role_id, meta)
 
     def set_password(self, data: str) -> None:
         """Password 需要 hash."""
-        self.password = generate_password_hash(data)
+        self.password = password_hasher.hash(data)
+
+
+article_counter = Counter(User.article_count)
+like_counter = Counter(User.like_count)
 
 
 class Role(BaseModel):
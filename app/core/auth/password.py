@@ -0,0 +1,83 @@
+"""密码 hash.
+
+PBKDF2 计算需要几十毫秒, 在 gevent worker 中同步计算会阻塞整个 hub. hash 和验证在进程池中执行,
+等待中的任务超过 PASSWORD_HASH_MAX_PENDING 时直接返回 503, 不再排队.
+
+配置:
+- PASSWORD_HASH_METHOD: werkzeug hash 方法, 修改后旧密码在下次登录成功时重新 hash
+- PASSWORD_HASH_WORKERS: 进程数
+- PASSWORD_HASH_MAX_PENDING: 最多等待中的任务数.
+"""
+import os
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Lock
+from typing import TypeVar
+
+from flask import Flask
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.core.exception import ServiceUnavailable
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    def __init__(self, method: str = "pbkdf2:sha256:600000", workers: int = 2, max_pending: int = 32) -> None:
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = Lock()
+        # 进程池不能跨 fork 使用, 子进程首次使用时重新创建
+        os.register_at_fork(after_in_child=self._reset)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault("PASSWORD_HASH_METHOD", self.method)
+        app.config.setdefault("PASSWORD_HASH_WORKERS", self.workers)
+        app.config.setdefault("PASSWORD_HASH_MAX_PENDING", self.max_pending)
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.max_pending = app.config["PASSWORD_HASH_MAX_PENDING"]
+
+    def _reset(self) -> None:
+        self._pool = None
+        self.pending = 0
+        self._lock = Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self._pool
+
+    def _done(self, future: "Future[object]") -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def run(self, func: Callable[..., T], *args: str) -> T:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise ServiceUnavailable(message="服务繁忙, 请稍后重试")
+            self.pending += 1
+        try:
+            future = self.pool.submit(func, *args)
+        except Exception:
+            self._done(None)  # type: ignore
+            raise
+        future.add_done_callback(self._done)
+        return future.result()
+
+    def hash(self, password: str) -> str:
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self.run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """密码 hash 的方法或参数与当前配置不同."""
+        return not password_hash.startswith(self.method + "$")
+
+
+password_hasher = PasswordHasher()
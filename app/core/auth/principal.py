@@ -0,0 +1,116 @@
+"""当前用户的身份信息(Principal).
+
+认证只需要用户 id 和角色、状态, 不需要加载完整的 User. Principal 通过 `app.core.cache` 缓存:
+本地缓存时间较短, 减少 redis 访问; redis 缓存在 User 修改并提交后删除.
+需要完整 User 的视图函数显式加载:
+
+```python
+principal = current_user.get()
+user = principal.load_user()
+```
+
+只有通过 session 修改 User 实例才会删除缓存, 直接 `update(User)` 修改这些字段时需要调用 `PrincipalNode.invalidate`.
+本地缓存只能删除当前进程的, 其他进程最多在本地缓存过期(PRINCIPAL_LOCAL_TTL)后更新.
+提交后删除 redis 缓存失败时只记录日志, 不影响已经成功的提交, 缓存最多在 PRINCIPAL_REDIS_TTL 后过期.
+"""
+from datetime import timedelta
+from typing import TYPE_CHECKING, ClassVar
+
+import structlog
+from flask import Flask
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import Manager, Node
+from app.core.model import db
+
+from .index import permission_index
+from .model import ADMIN_ROLE_ID, User
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import UOWTransaction
+
+    from app.core.cache.typing import STORAGE_NAME, Cache
+
+    from .permission import PermissionMeta
+
+principal_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.auth")
+
+manager = Manager()
+
+
+class Principal(BaseModel):
+    id: int
+    role_id: int
+    status: int
+    is_deleted: int
+
+    def is_admin(self) -> bool:
+        return self.role_id == ADMIN_ROLE_ID
+
+    def has_permission(self, meta: "PermissionMeta") -> bool:
+        return permission_index.has_permission(self.role_id, meta)
+
+    def load_user(self) -> User | None:
+        """加载完整的 User."""
+        return User.get_by_id(self.id)
+
+
+class PrincipalNode(Node[Principal]):
+    storages: ClassVar[list["Cache | STORAGE_NAME"]] = []
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+
+    def key(self) -> str:
+        return str(self.user_id)
+
+    def load(self) -> Principal | None:
+        statement = select(User.id, User.role_id, User.status, User.is_deleted).where(User.id == self.user_id)
+        with db.connect() as _session:
+            row = _session.execute(statement).first()
+        return Principal(**row._asdict()) if row else None
+
+    @classmethod
+    def init_app(cls, app: Flask) -> None:
+        app.config.setdefault("PRINCIPAL_LOCAL_TTL", 5)
+        app.config.setdefault("PRINCIPAL_REDIS_TTL", 300)
+        cls.storages = [
+            {"storage": "local", "ttl": timedelta(seconds=app.config["PRINCIPAL_LOCAL_TTL"])},
+            {"storage": "redis", "ttl": timedelta(seconds=app.config["PRINCIPAL_REDIS_TTL"])},
+        ]
+
+    @classmethod
+    def get(cls, user_id: int) -> Principal | None:
+        return manager.get(cls(user_id))
+
+    @classmethod
+    def invalidate(cls, user_id: int) -> None:
+        node = cls(user_id)
+        for storage in cls.storages:
+            name = storage if isinstance(storage, str) else storage["storage"]
+            if name in manager.all_storages:
+                manager.remove(node, name)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context: "UOWTransaction") -> None:
+    user_ids: set[int] = session.info.setdefault("changed_users", set())
+    user_ids.update(obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals(session: Session) -> None:
+    for user_id in session.info.pop("changed_users", ()):
+        try:
+            PrincipalNode.invalidate(user_id)
+        except RedisError:
+            # 数据库已经提交, 不能让 commit() 抛出异常
+            principal_logger.warning("principal invalidation failed", user_id=user_id, exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session) -> None:
+    session.info.pop("changed_users", None)
@@ -0,0 +1,188 @@
+"""token 吊销.
+
+被吊销的 token id(jti)写入 redis, 过期时间为 token 的剩余有效期; 同时记录在两个有序集合中:
+- index: score 为过期时间, 每 JWT_REVOCATION_REBUILD_INTERVAL 秒清理过期记录并全量重建本地的布隆过滤器;
+- log: score 为吊销时间(毫秒), 每 JWT_REVOCATION_SYNC_INTERVAL 秒只读取上次同步之后新增的记录.
+大部分请求的 token 没有被吊销, 布隆过滤器判断不存在时不需要访问 redis, 判断可能存在时再查询 redis 确认.
+
+强制用户下线时吊销该用户在此之前签发的所有 token(按毫秒精度的 iat 判断, 之后重新登录的 token 不受影响).
+
+其他 worker 吊销的 token 最多在 JWT_REVOCATION_SYNC_INTERVAL 秒后生效, 当前 worker 吊销的立即生效.
+redis 不可用时不检查吊销(fail-open), 只记录日志: token 的有效期较短, 可用性优先.
+"""
+import hashlib
+import math
+import time
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+import redis
+import structlog
+from flask import Flask
+
+if TYPE_CHECKING:
+    from redis import Redis
+
+    BaseRedis = Redis[bytes]
+
+revoke_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.auth")
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001) -> None:
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        # 双重哈希: 由两个 64 位哈希值组合出 k 个位置
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationStore:
+    def __init__(self) -> None:
+        self.redis_client: BaseRedis | None = None
+        self.prefix = "revoked"
+        self.sync_interval = 5.0
+        self.rebuild_interval = 600.0
+        self.capacity = 100000
+        self.bloom = BloomFilter(self.capacity)
+        self.synced_at = 0.0
+        self.rebuilt_at = 0.0
+        # 已同步的 log 位置(毫秒)
+        self.log_cursor = 0
+        self._lock = Lock()
+
+    def init_app(self, app: Flask, redis_client: "BaseRedis") -> None:
+        app.config.setdefault("JWT_REVOCATION_SYNC_INTERVAL", 5)
+        app.config.setdefault("JWT_REVOCATION_REBUILD_INTERVAL", 600)
+        app.config.setdefault("JWT_REVOCATION_CAPACITY", 100000)
+        self.sync_interval = app.config["JWT_REVOCATION_SYNC_INTERVAL"]
+        self.rebuild_interval = app.config["JWT_REVOCATION_REBUILD_INTERVAL"]
+        self.capacity = app.config["JWT_REVOCATION_CAPACITY"]
+        self.redis_client = redis_client
+        app.extensions["revocation"] = self
+
+    @property
+    def client(self) -> "BaseRedis":
+        if self.redis_client is None:
+            raise RuntimeError("Revocation redis client is not set, call revocations.init_app() first")
+        return self.redis_client
+
+    @property
+    def index_key(self) -> str:
+        return f"{self.prefix}:index"
+
+    @property
+    def log_key(self) -> str:
+        return f"{self.prefix}:log"
+
+    @property
+    def log_retention(self) -> int:
+        """吊销记录 log 保留的时间(毫秒), 超过该时间没有同步的 worker 需要全量重建."""
+        return int(self.rebuild_interval * 2 * 1000)
+
+    def _revoke(self, member: str, value: Any, expires_at: int) -> None:
+        ttl = expires_at - int(time.time())
+        if ttl <= 0:
+            return
+        now_ms = time.time_ns() // 1_000_000
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(f"{self.prefix}:{member}", value, ex=ttl)
+            pipe.zadd(self.index_key, {member: expires_at})
+            pipe.zadd(self.log_key, {member: now_ms})
+            pipe.zremrangebyscore(self.log_key, "-inf", now_ms - self.log_retention)
+            pipe.execute()
+        with self._lock:
+            self.bloom.add(member)
+
+    def revoke(self, jti: str, exp: int) -> None:
+        """吊销单个 token, exp 为 token 的过期时间."""
+        self._revoke(f"jti:{jti}", 1, exp)
+
+    def revoke_user(self, user_id: int, max_age: int) -> None:
+        """吊销用户现在之前签发的所有 token, max_age 为 token 的最长有效期(秒). 记录的吊销时间为毫秒."""
+        now_ms = time.time_ns() // 1_000_000
+        self._revoke(f"user:{user_id}", now_ms, now_ms // 1000 + max_age + 1)
+
+    def rebuild(self) -> None:
+        """清理已过期的记录, 并从 index 全量重建布隆过滤器."""
+        now = int(time.time())
+        cursor = time.time_ns() // 1_000_000
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.index_key, "-inf", now)
+            pipe.zrange(self.index_key, 0, -1)
+            _, members = pipe.execute()
+        bloom = BloomFilter(max(self.capacity, len(members) * 2))
+        for member in members:
+            bloom.add(member.decode())
+        with self._lock:
+            self.bloom = bloom
+            self.log_cursor = cursor
+
+    def sync(self) -> None:
+        """增量同步: 只读取上次同步之后吊销的记录."""
+        now_ms = time.time_ns() // 1_000_000
+        if time.monotonic() - self.rebuilt_at >= self.rebuild_interval or now_ms - self.log_cursor > self.log_retention:
+            self.rebuilt_at = time.monotonic()
+            self.rebuild()
+            return
+        # 各服务器的时钟可能有偏差, 多读取一段, 重复添加不影响结果
+        members = self.client.zrangebyscore(self.log_key, self.log_cursor - 5000, "+inf")
+        with self._lock:
+            for member in members:
+                self.bloom.add(member.decode())
+            self.log_cursor = now_ms
+
+    def maybe_sync(self) -> None:
+        now = time.monotonic()
+        if now - self.synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if now - self.synced_at < self.sync_interval:
+                return
+            self.synced_at = now
+        try:
+            self.sync()
+        except redis.exceptions.RedisError:
+            # 同步失败时继续使用旧的过滤器, 下个周期重试
+            revoke_logger.warning("revocation sync failed", exc_info=True)
+
+    def is_revoked(self, payload: dict[str, Any]) -> bool:
+        if self.redis_client is None:
+            return False
+        self.maybe_sync()
+        members = []
+        if payload.get("jti"):
+            members.append(f"jti:{payload['jti']}")
+        if (payload.get("sub") or {}).get("user_id") is not None:
+            members.append(f"user:{payload['sub']['user_id']}")
+        candidates = [member for member in members if member in self.bloom]
+        if not candidates:
+            return False
+        # 布隆过滤器可能误判, 查询 redis 确认
+        try:
+            values = self.client.mget([f"{self.prefix}:{member}" for member in candidates])
+        except redis.exceptions.RedisError:
+            # fail-open: 无法确认时视为未吊销
+            revoke_logger.warning("revocation check failed", exc_info=True)
+            return False
+        issued_at = round(payload.get("iat", 0) * 1000)
+        for member, value in zip(candidates, values, strict=True):
+            if value is None:
+                continue
+            if member.startswith("jti:") or issued_at < int(value):
+                return True
+        return False
+
+
+revocations = RevocationStore()
@@ -1,6 +1,28 @@
-from pydantic import BaseModel
+from datetime import date
+
+from pydantic import BaseModel, Field
+
+from app.core.schema.common import email_pattern
 
 
 class LoginScheme(BaseModel):
     username: str
     password: str
+
+
+class ImportProfileSchema(BaseModel):
+    """批量导入时允许设置的资料字段, 未设置时使用 User 的默认值.
+
+    角色、状态、计数等字段不能通过导入文件设置.
+    """
+
+    signature: str | None = Field(None, max_length=200)
+    avatar: str | None = Field(None, max_length=255)
+    email: str | None = Field(None, max_length=255, regex=email_pattern)
+    gender: int | None = Field(None, ge=0, le=2, description="0-未设置, 1-女, 2-男")
+    birthday: date | None = None
+    address: str | None = Field(None, max_length=100)
+    company: str | None = Field(None, max_length=50)
+    career: str | None = Field(None, max_length=50)
+    home_url: str | None = Field(None, max_length=100)
+    github: str | None = Field(None, max_length=255)
@@ -0,0 +1,132 @@
+"""启动时将 `permission_metas` 同步到 permission 表.
+
+同一份权限声明(按内容计算指纹)只同步一次: 获得 redis 锁的 worker 对比数据库中的权限, 执行一次批量 upsert 和一次批量删除,
+完成后写入指纹标记; 其他 worker 等待标记出现后直接返回.
+
+```python
+# config/gunicorn.py post_worker_init
+sync_permissions(redis_client, prune=config.PERMISSION_SYNC_PRUNE)
+```
+
+默认只新增和更新. `prune=True`(配置 PERMISSION_SYNC_PRUNE)时删除代码中已经不存在的权限, 同时删除角色与这些权限的关联;
+没有任何权限声明时不删除, 避免清空整个权限表.
+"""
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+import structlog
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import mysql, sqlite
+
+from app.core.model import db
+
+from .model import Permission, RolePermission
+from .permission import permission_metas
+
+if TYPE_CHECKING:
+    from redis import Redis
+
+    BaseRedis = Redis[bytes]
+
+sync_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.permission")
+
+LOCK_KEY = "permission:sync:lock"
+DONE_KEY = "permission:sync:done:{}"
+
+
+@dataclass(slots=True)
+class SyncResult:
+    upserted: int = 0
+    deleted: int = 0
+
+
+def declared_permissions() -> dict[tuple[str, str], str]:
+    """(module, name) -> info, 同一权限声明多次时取排序后的第一个 info."""
+    result: dict[tuple[str, str], str] = {}
+    for meta in sorted(permission_metas, key=lambda meta: (meta.module, meta.auth, meta.info)):
+        result.setdefault((meta.module, meta.auth), meta.info)
+    return result
+
+
+def fingerprint(declared: dict[tuple[str, str], str], prune: bool = False) -> str:
+    return hashlib.sha1(repr((sorted(declared.items()), prune)).encode(), usedforsecurity=False).hexdigest()
+
+
+def upsert_statement(values: list[dict[str, Any]]) -> Any:
+    """按唯一索引 (name, module) 插入或更新 info."""
+    dialect = db.engine.dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(Permission).values(values)
+        return statement.on_duplicate_key_update(
+            info=statement.inserted.info,
+            update_time=statement.inserted.update_time,
+        )
+    if dialect == "sqlite":
+        statement = sqlite.insert(Permission).values(values)
+        return statement.on_conflict_do_update(
+            index_elements=["name", "module"],
+            set_={"info": statement.excluded.info, "update_time": statement.excluded.update_time},
+        )
+    raise ValueError(f"Upsert is not supported for {dialect}")
+
+
+def apply(declared: dict[tuple[str, str], str], prune: bool = False) -> SyncResult:
+    """对比数据库中的权限, 一次批量 upsert, prune 时一次批量删除, 在同一个事务中提交."""
+    result = SyncResult()
+    with db.connect() as _session:
+        existed = {
+            (module, name): (id, info)
+            for id, module, name, info in _session.execute(
+                select(Permission.id, Permission.module, Permission.name, Permission.info)
+            )
+        }
+        values = [
+            {"module": module, "name": name, "info": info, "create_time": func.now(), "update_time": func.now()}
+            for (module, name), info in declared.items()
+            if (module, name) not in existed or existed[(module, name)][1] != info
+        ]
+        if values:
+            _session.execute(upsert_statement(values))
+            result.upserted = len(values)
+        # 没有声明时很可能是声明的模块没有被导入, 不能据此删除
+        removed = [id for key, (id, _) in existed.items() if key not in declared] if prune and declared else []
+        if removed:
+            _session.execute(delete(RolePermission).where(RolePermission.permission_id.in_(removed)))
+            _session.execute(delete(Permission).where(Permission.id.in_(removed)))
+            result.deleted = len(removed)
+        _session.commit()
+    return result
+
+
+def sync_permissions(
+    redis_client: "BaseRedis",
+    prune: bool = False,
+    wait: timedelta = timedelta(seconds=30),
+    poll_interval: float = 0.5,
+) -> SyncResult | None:
+    """同步权限, 由当前 worker 执行时返回结果, 已经同步过或由其他 worker 执行时返回 None."""
+    # 导入 task 包会创建 celery app, 只在同步时导入
+    from task.lock import Lock, RedisLockError
+
+    declared = declared_permissions()
+    done_key = DONE_KEY.format(fingerprint(declared, prune))
+    deadline = time.monotonic() + wait.total_seconds()
+    while not redis_client.exists(done_key):
+        try:
+            with Lock(LOCK_KEY, expiration=wait, redis_client=redis_client):
+                # 获得锁后再次检查, 可能刚由其他 worker 同步完成
+                if redis_client.exists(done_key):
+                    return None
+                result = apply(declared, prune)
+                redis_client.set(done_key, 1, ex=timedelta(days=7))
+                sync_logger.info("permissions synced", upserted=result.upserted, deleted=result.deleted)
+                return result
+        except RedisLockError:
+            if time.monotonic() > deadline:
+                sync_logger.warning("waiting for permission sync timed out")
+                return None
+            time.sleep(poll_interval)
+    return None
@@ -3,9 +3,11 @@
 from .core import Manager
 from .model import Node
 from .storage import RedisStorage
+from .version import VersionStore
 
 __all__ = (
     "Manager",
     "Node",
     "RedisStorage",
+    "VersionStore",
 )
@@ -11,8 +11,10 @@ T = TypeVar("T")
 
 
 class _Locker:
-    lock: Lock = Lock()
-    result: Any = None
+    def __init__(self) -> None:
+        # 每个 key 独立的锁, 不同 key 之间不会互相阻塞
+        self.lock = Lock()
+        self.result: Any = None
 
 
 test_set = set()
@@ -64,7 +66,11 @@ class Manager:
                 if result is None:
                     # 没有缓存,从数据库中加载
 
-                    result = node.load()
+                    try:
+                        result = node.load()
+                    except Exception as e:
+                        self._awaiting.pop(node.full_key(), None)
+                        raise e
                 _locker.result = result
                 for storage in miss_storages:
                     # 填充缓存
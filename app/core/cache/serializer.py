@@ -1,5 +1,6 @@
 import importlib
 import json
+import pickle
 from typing import Any
 
 import pydantic
@@ -53,3 +54,13 @@ class JSONSerializer:
 
     def loads(self, blob: bytes) -> Any:
         return json.loads(blob.decode(), object_hook=object_decoder)
+
+
+class PickleSerializer:
+    """可以序列化任意 Python 对象(包括 ORM 实例), 只能用于本服务自己写入的缓存."""
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, blob: bytes) -> Any:
+        return pickle.loads(blob)  # noqa: S301
@@ -0,0 +1,52 @@
+"""版本号计数器.
+
+用于基于版本的缓存失效: 缓存 key 中包含相关名称(表名、标签等)的版本号,
+数据变化时只需要递增版本号, 旧 key 不再被访问, 等待过期即可, 不需要记录和删除每个 key.
+
+不传入 redis client 时使用进程内计数器, 只适用于单进程(开发、测试).
+"""
+from collections.abc import Iterable, Sequence
+from threading import Lock
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from redis import Redis, RedisCluster
+
+    BaseRedis = Redis[bytes]
+    BaseRedisCluster = RedisCluster[bytes]
+
+
+class VersionStore:
+    def __init__(self, client: Union["BaseRedis", "BaseRedisCluster", None] = None, prefix: str = "version") -> None:
+        self.client = client
+        self.prefix = prefix
+        self._local: dict[str, int] = {}
+        self._lock = Lock()
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def get(self, name: str) -> int:
+        return self.get_many([name])[0]
+
+    def get_many(self, names: Sequence[str]) -> list[int]:
+        if not names:
+            return []
+        if self.client is None:
+            return [self._local.get(name, 0) for name in names]
+        return [int(value or 0) for value in self.client.mget([self._key(name) for name in names])]
+
+    def bump(self, names: Iterable[str]) -> None:
+        """递增版本号, 使包含旧版本号的缓存失效."""
+        names = list(names)
+        if not names:
+            return
+        if self.client is None:
+            with self._lock:
+                for name in names:
+                    self._local[name] = self._local.get(name, 0) + 1
+            return
+        with self.client.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(self._key(name))
+            pipe.execute()
@@ -7,13 +7,16 @@
     - error_code: 自定义错误码.
     - message: 错误信息.
     - errors(可选): 错误信息列表.
+    - headers(可选): 额外的响应头.
 - NotFound: 404 异常.
 
+使用默认 message 且没有 errors 的异常响应体不变, `APIException.init_app(app)` 时按 app 的 JSON provider 预先编码,
+之后定义的子类在第一次使用时编码并缓存.
 """
 from collections.abc import Iterable
 from typing import TYPE_CHECKING, Any
 
-from flask import jsonify
+from flask import Flask, Response, current_app
 from werkzeug.exceptions import HTTPException
 
 if TYPE_CHECKING:
@@ -39,6 +42,7 @@ class APIException(HTTPException):
     error_code: int = 9999
     message: str = "Service Error"
     errors: list[Any] | None = None
+    headers: dict[str, str] | None = None
 
     def __init__(
         self,
@@ -47,6 +51,7 @@ class APIException(HTTPException):
         error_code: int | None = None,
         message: str | None = None,
         errors: list[Any] | None = None,
+        headers: dict[str, str] | None = None,
     ) -> None:
         if status_code is not None:
             self.status_code = status_code
@@ -56,6 +61,8 @@ class APIException(HTTPException):
             self.message = message
         if errors is not None:
             self.errors = errors
+        if headers is not None:
+            self.headers = headers
         super().__init__(self.message)
 
     def to_dict(self) -> dict[str, Any]:
@@ -67,9 +74,36 @@ class APIException(HTTPException):
             data["errors"] = self.errors
         return data
 
+    @classmethod
+    def init_app(cls, app: Flask) -> None:
+        """使用 app 的 JSON provider 预先编码所有子类的默认响应体, 在设置 `app.json` 之后调用."""
+        encoded: dict[type[APIException], bytes] = app.extensions.setdefault("api_exception", {})
+        pending: list[type[APIException]] = [cls]
+        while pending:
+            klass = pending.pop()
+            pending.extend(klass.__subclasses__())
+            encoded[klass] = cls._dumps(klass().to_dict(), app.json)
+
+    def encode(self) -> bytes:
+        cls = type(self)
+        if self.errors is not None or self.message != cls.message or self.error_code != cls.error_code:
+            return self._dumps(self.to_dict(), current_app.json)
+        encoded: dict[type[APIException], bytes] = current_app.extensions.setdefault("api_exception", {})
+        body = encoded.get(cls)
+        if body is None:
+            body = encoded[cls] = self._dumps(self.to_dict(), current_app.json)
+        return body
+
+    @staticmethod
+    def _dumps(data: dict[str, Any], provider: Any) -> bytes:
+        if hasattr(provider, "dumps_bytes"):
+            return provider.dumps_bytes(data) + b"\n"
+        return (provider.dumps(data) + "\n").encode()
+
     def __call__(self, environ: "WSGIEnvironment", start_response: "StartResponse") -> Iterable[bytes]:
-        response = jsonify(self.to_dict())
-        response.status_code = self.status_code
+        response = Response(self.encode(), status=self.status_code, mimetype="application/json")
+        if self.headers:
+            response.headers.update(self.headers)
         return response(environ, start_response)
 
 
@@ -125,3 +159,15 @@ class ServerError(APIException):
     status_code: int = 500
     message: str = "Server Error"
     error_code: int = 9999
+
+
+class TooManyRequests(APIException):
+    status_code: int = 429
+    message: str = "Too Many Requests"
+    error_code: int = 1029
+
+
+class ServiceUnavailable(APIException):
+    status_code: int = 503
+    message: str = "Service Unavailable"
+    error_code: int = 9503
@@ -45,6 +45,8 @@ class Logger:
             status_code = response.status_code
             remote_addr = request.remote_addr
             message = f'{remote_addr} - "{http_method} {url} {http_version}" {status_code}'
+            # DB 插件记录的本次请求 SQL 统计
+            query_stats = g.get("query_stats")
             access_logger.info(
                 message,
                 http={
@@ -55,6 +57,7 @@ class Logger:
                 },
                 network={"client": remote_addr},
                 duration=process_time,
+                db=query_stats.to_dict() if query_stats is not None else None,
             )
             return response
 
@@ -1,10 +1,24 @@
+from .aio import async_db
+from .cache import query_cache
+from .counter import Counter
 from .db import db, session
+from .loader import Loader
 from .model import BaseModel, T_create_time, T_id, T_update_time
+from .shard import HashShard, RangeShard, Sharding
+from .snowflake import snowflake
 
 __all__ = (
     "db",
     "session",
+    "async_db",
+    "query_cache",
     "BaseModel",
+    "Loader",
+    "Counter",
+    "snowflake",
+    "Sharding",
+    "HashShard",
+    "RangeShard",
     "T_id",
     "T_create_time",
     "T_update_time",
@@ -0,0 +1,68 @@
+"""asyncio 下的数据库访问.
+
+与 `DB` 共用同一套 `BaseModel` 映射, 供 websocket 等 asyncio 服务原生查询数据库, 不再通过 `asyncio.to_thread`
+占用线程:
+
+```python
+from app.core.model import async_db
+
+async_db.init(config.DB_URL)  # mysql+pymysql 自动换成 mysql+aiomysql
+user = await User.aget_by_id(1)
+await async_db.dispose()
+```
+"""
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .db import DB
+
+# 同步驱动 -> 异步驱动
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+class AsyncDB:
+    engine: AsyncEngine
+    Session: async_sessionmaker[AsyncSession]
+
+    def init(
+        self,
+        url: str,
+        pool_size: int = 10,
+        max_overflow: int = 10,
+        pool_recycle: int = 3600,
+        echo: bool = False,
+    ) -> None:
+        url = to_async_url(url)
+        pool_args: dict[str, Any] = (
+            {} if url.startswith("sqlite") else {"pool_size": pool_size, "max_overflow": max_overflow}
+        )
+        self.engine = create_async_engine(
+            url,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=True,
+            echo=echo,
+            **pool_args,
+        )
+        DB.instrument(self.engine.sync_engine)
+        # 提交后不过期, 否则 await 之后访问属性会触发隐式 IO
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def connect(self) -> AsyncSession:
+        """生成新的 session, 使用 `async with` 确保关闭."""
+        return self.Session()
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+
+
+async_db = AsyncDB()
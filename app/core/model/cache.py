@@ -0,0 +1,135 @@
+"""查询结果缓存.
+
+对开启缓存的 model, `get_by_attr`/`get_all`/`count` 的结果通过 `app.core.cache` 缓存,
+key 由编译后的 SQL、绑定参数和涉及的每张表的版本号组成.
+session 提交时递增写入过的表的版本号, 该表相关的缓存随之失效, 不需要记录每个缓存 key.
+
+```python
+class Role(BaseModel):
+    __query_cache__ = True
+
+query_cache.init_app(app, VersionStore(redis_client))
+Role.get_by_attr(name="admin")  # 第二次起从缓存读取
+```
+
+只有通过 session(ORM 或 `session.execute(update(...))`)的写入才会使缓存失效, 直接使用 engine 或其他服务写库时,
+需要手动调用 `query_cache.invalidate`. 不需要使缓存失效的写入(如计数器写回)可以设置执行选项
+`execution_options(invalidate_query_cache=False)`.
+
+提交后递增版本号失败(redis 不可用)时只记录日志, 不影响已经成功的提交, 缓存最多在 QUERY_CACHE_TTL 后过期.
+"""
+import hashlib
+from collections.abc import Callable, Iterable
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, ClassVar, TypeVar
+
+import structlog
+from flask import Flask
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.sql.util import find_tables
+
+from app.core.cache import Manager, Node, VersionStore
+from app.core.cache.serializer import PickleSerializer
+
+from .db import db
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import UOWTransaction
+    from sqlalchemy.sql import Executable
+
+    from app.core.cache.typing import STORAGE_NAME, Cache
+
+T = TypeVar("T")
+
+cache_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.db")
+
+
+class QueryNode(Node[list[Any]]):
+    storages: ClassVar[list["Cache | STORAGE_NAME"]] = []
+
+    def __init__(self, digest: str, loader: Callable[[], list[Any]]) -> None:
+        self.digest = digest
+        self.loader = loader
+
+    def key(self) -> str:
+        return self.digest
+
+    def load(self) -> list[Any]:
+        return self.loader()
+
+
+class QueryCache:
+    def __init__(self) -> None:
+        self.versions = VersionStore()
+        self.manager = Manager()
+        # ORM 实例无法用 JSON 序列化
+        self.manager.serializer = PickleSerializer()
+
+    def init_app(self, app: Flask, versions: VersionStore | None = None) -> None:
+        app.config.setdefault("QUERY_CACHE_TTL", 300)
+        # 按顺序查找, 本地缓存在前可以省去一次 redis 读取
+        app.config.setdefault("QUERY_CACHE_STORAGES", ["local", "redis"])
+        if versions is not None:
+            self.versions = versions
+        ttl = timedelta(seconds=app.config["QUERY_CACHE_TTL"])
+        QueryNode.storages = [{"storage": name, "ttl": ttl} for name in app.config["QUERY_CACHE_STORAGES"]]
+        app.extensions["query_cache"] = self
+
+    def fetch(self, statement: "Executable", loader: Callable[[], list[T]]) -> list[T]:
+        """从缓存获得 statement 的结果, 未命中时调用 loader 查询并写入缓存."""
+        tables = sorted({table.name for table in find_tables(statement, include_joins=True)})  # type: ignore
+        compiled = statement.compile(dialect=db.engine.dialect)
+        versions = self.versions.get_many(tables)
+        digest = hashlib.blake2b(
+            f"{compiled}|{sorted(compiled.params.items())!r}|{tables!r}|{versions!r}".encode(),
+            digest_size=16,
+        ).hexdigest()
+        result = self.manager.get(QueryNode(digest, loader))
+        return result if result is not None else loader()
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        """使涉及这些表的缓存失效."""
+        self.versions.bump(tables)
+
+
+query_cache = QueryCache()
+
+
+def _written_tables(session: Session) -> set[str]:
+    return session.info.setdefault("written_tables", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session: Session, flush_context: "UOWTransaction") -> None:
+    tables = _written_tables(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tables.update(table.name for table in inspect(obj).mapper.tables)  # type: ignore
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state: ORMExecuteState) -> None:
+    # session.execute(update(...)/delete(...)/insert(...)) 不经过 flush
+    if not orm_execute_state.execution_options.get("invalidate_query_cache", True):
+        return
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = orm_execute_state.statement.table  # type: ignore
+        _written_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_table_versions(session: Session) -> None:
+    tables = session.info.pop("written_tables", None)
+    if not tables:
+        return
+    try:
+        query_cache.invalidate(tables)
+    except RedisError:
+        # 数据库已经提交, 不能让 commit() 抛出异常
+        cache_logger.warning("query cache invalidation failed", tables=sorted(tables), exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session: Session) -> None:
+    session.info.pop("written_tables", None)
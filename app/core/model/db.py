@@ -1,16 +1,141 @@
+import ipaddress
+import os
+import re
+import time
+from collections import Counter
 from contextvars import ContextVar
-from typing import cast
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, cast
 
-from flask import Flask
-from sqlalchemy import create_engine
+import structlog
+from flask import Blueprint, Flask, Response, g, jsonify, request
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from werkzeug.local import LocalProxy
 
+from app.core.exception import Forbidden
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, ExceptionContext, ExecutionContext
+    from sqlalchemy.pool import ConnectionPoolEntry, PoolProxiedConnection
+
 ctx_session: ContextVar[Session] = ContextVar("session")
 
+db_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.db")
+
+# 将 IN (%s, %s, ...) 这类数量可变的参数列表归一化, 使同一语句的不同批次得到相同的 shape
+_in_params_pattern = re.compile(r"\((?:\s*(?:%s|\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:%s|\?|%\(\w+\)s|:\w+)\s*\)")
+
+
+@dataclass(slots=True)
+class QueryStats:
+    """单个请求内的 SQL 统计.
+
+    Attributes:
+        count (int): 执行的语句数量.
+        duration (int): 数据库总耗时(ns).
+        pool_wait (int): 等待连接池分配连接的总耗时(ns).
+        slowest (int): 最慢语句耗时(ns).
+        slowest_statement (str): 最慢语句.
+        shapes (Counter[str]): 每种语句 shape 的执行次数, 用于发现 N+1 查询.
+    """
+
+    count: int = 0
+    duration: int = 0
+    pool_wait: int = 0
+    slowest: int = 0
+    slowest_statement: str = ""
+    shapes: Counter[str] = field(default_factory=Counter)
+
+    def record(self, statement: str, duration: int) -> None:
+        self.count += 1
+        self.duration += duration
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+        self.shapes[_in_params_pattern.sub("(...)", statement)] += 1
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """执行次数不少于 threshold 的语句 shape, 即疑似 N+1 查询."""
+        return {shape: times for shape, times in self.shapes.items() if times >= threshold}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "duration": self.duration,
+            "pool_wait": self.pool_wait,
+            "slowest": self.slowest,
+            "slowest_statement": self.slowest_statement,
+        }
+
+
+ctx_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@dataclass(slots=True)
+class PoolStats:
+    """连接池统计, 进程内累计.
+
+    Attributes:
+        checkouts (int): 从连接池获取连接的次数.
+        timeouts (int): 等待连接超时(连接池耗尽)的次数.
+        wait_total (int): 获取连接的总等待时间(ns), 包括新建连接的时间.
+        wait_max (int): 获取连接的最长等待时间(ns).
+        connections (dict[int, float]): 当前打开的连接及其建立时间(monotonic), 用于计算连接年龄.
+    """
+
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_total: int = 0
+    wait_max: int = 0
+    connections: dict[int, float] = field(default_factory=dict)
+
+    def record_wait(self, wait: int) -> None:
+        self.checkouts += 1
+        self.wait_total += wait
+        if wait > self.wait_max:
+            self.wait_max = wait
+        stats = ctx_query_stats.get()
+        if stats is not None:
+            stats.pool_wait += wait
+
+    def reset(self) -> None:
+        self.checkouts = self.timeouts = self.wait_total = self.wait_max = 0
+        self.connections.clear()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录获取连接等待时间的 QueuePool."""
+
+    stats: PoolStats | None = None
+
+    def connect(self) -> "PoolProxiedConnection":
+        start = time.perf_counter_ns()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            if self.stats is not None:
+                self.stats.timeouts += 1
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter_ns() - start)
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # engine.dispose() 时会重建连接池, 统计需要延续
+        pool = cast(InstrumentedQueuePool, super().recreate())
+        pool.stats = self.stats
+        return pool
+
 
 class DB:
+    _fork_registered: bool = False
+
     def __init__(self, app: Flask | None = None) -> None:
+        self.pool_stats = PoolStats()
         if app is not None:
             self.init_app(app)
 
@@ -20,25 +145,191 @@ class DB:
         app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
 
         app.before_request(self.before_request)
+        app.after_request(self.after_request)
         app.teardown_request(self.teardown_request)
         db_url = app.config.get("DB_URL")
         if db_url is None:
             raise ValueError("DB_URL must be set")
+        self.engine = self.create_engine(db_url)
+        self.Session = sessionmaker(self.engine)
+        # 分片: 分片名 -> 数据库 url, 见 `app.core.model.shard`
+        self.shard_engines: dict[str, Engine] = {
+            name: self.create_engine(url) for name, url in (app.config.get("DB_SHARDS") or {}).items()
+        }
+        self.shard_sessions = {name: sessionmaker(engine) for name, engine in self.shard_engines.items()}
+        if not self._fork_registered:
+            # gunicorn/celery fork 出的子进程不能复用父进程的连接
+            os.register_at_fork(after_in_child=self.dispose_after_fork)
+            self._fork_registered = True
+        if app.config.get("DB_METRICS_URL"):
+            app.register_blueprint(
+                self.metrics_blueprint(app.config["DB_METRICS_URL"], app.config["DB_METRICS_ALLOWED_IPS"])
+            )
+        app.extensions["sqlalchemy"] = self
+
+    def create_engine(self, db_url: str) -> "Engine":
+        """按配置创建 engine, 并注册 SQL 和连接池统计."""
+        app = self.app
         connect_args = {"check_same_thread": False} if "sqlite" in db_url else {}
-        self.engine = create_engine(
+        # sqlite 使用默认连接池, 不支持 overflow 和 timeout
+        pool_args: dict[str, Any] = (
+            {}
+            if "sqlite" in db_url
+            else {
+                "poolclass": InstrumentedQueuePool,
+                "max_overflow": app.config.get("DB_MAX_OVERFLOW"),
+                "pool_timeout": app.config.get("DB_POOL_TIMEOUT"),
+            }
+        )
+        engine = create_engine(
             url=db_url,  # type: ignore[reportUnknownArgumentType]
             connect_args=connect_args,
             pool_size=app.config.get("DB_POOL_SIZE"),
-            pool_recycle=7200,
+            pool_recycle=app.config.get("DB_POOL_RECYCLE"),
+            pool_pre_ping=app.config.get("DB_POOL_PRE_PING"),
             echo=app.config.get("DB_ECHO"),
+            **pool_args,
         )
-        self.Session = sessionmaker(self.engine)
-        app.extensions["sqlalchemy"] = self
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.stats = self.pool_stats
+        self.instrument(engine)
+        self.instrument_pool(engine)
+        return engine
+
+    def metrics_blueprint(self, url: str, allowed_ips: list[str]) -> Blueprint:
+        """连接池统计路由, 只允许 allowed_ips 访问, 其他来源返回 403."""
+        networks = [ipaddress.ip_network(ip) for ip in allowed_ips]
+        blueprint = Blueprint("db_internal", __name__)
+
+        @blueprint.before_request
+        def check_ip() -> None:
+            try:
+                address = ipaddress.ip_address(request.remote_addr or "")
+            except ValueError:
+                raise Forbidden() from None
+            if not any(address in network for network in networks):
+                raise Forbidden()
+
+        blueprint.add_url_rule(url, "metrics", lambda: jsonify(self.pool_status()))
+        return blueprint
 
     def config(self, app: Flask) -> None:
         app.config.setdefault("DB_URL", "sqlite:///:memory:")
         app.config.setdefault("DB_POOL_SIZE", 10)
         app.config.setdefault("DB_ECHO", False)
+        app.config.setdefault("DB_MAX_OVERFLOW", 10)
+        app.config.setdefault("DB_POOL_TIMEOUT", 30)
+        app.config.setdefault("DB_POOL_RECYCLE", 3600)
+        app.config.setdefault("DB_POOL_PRE_PING", True)
+        # worker 启动时预先建立的连接数
+        app.config.setdefault("DB_POOL_WARMUP", 2)
+        # 连接池统计路由, 为 None 时不注册
+        app.config.setdefault("DB_METRICS_URL", None)
+        # 允许访问连接池统计的 IP 或网段, 使用反向代理时需要 ProxyFix 才能获得客户端 IP
+        app.config.setdefault("DB_METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+        app.config.setdefault("DB_SHARDS", {})
+        # 同一请求中相同 shape 的语句执行次数达到该值时视为 N+1 查询
+        app.config.setdefault("DB_N_PLUS_ONE_THRESHOLD", 5)
+
+    @staticmethod
+    def instrument(engine: "Engine") -> None:
+        """注册 SQL 统计事件, 只在存在请求级 QueryStats 时记录."""
+
+        def before_cursor_execute(
+            conn: "Connection",
+            cursor: Any,
+            statement: str,
+            parameters: Any,
+            context: "ExecutionContext | None",
+            executemany: bool,
+        ) -> None:
+            conn.info.setdefault("query_start", []).append(time.perf_counter_ns())
+
+        def after_cursor_execute(
+            conn: "Connection",
+            cursor: Any,
+            statement: str,
+            parameters: Any,
+            context: "ExecutionContext | None",
+            executemany: bool,
+        ) -> None:
+            start = conn.info["query_start"].pop()
+            stats = ctx_query_stats.get()
+            if stats is not None:
+                stats.record(statement, time.perf_counter_ns() - start)
+
+        def handle_error(context: "ExceptionContext") -> None:
+            # 执行失败时不会触发 after_cursor_execute, 需要取出开始时间, 否则残留在连接池的连接上
+            conn = context.connection
+            if conn is None or context.execution_context is None or not conn.info.get("query_start"):
+                return
+            start = conn.info["query_start"].pop()
+            stats = ctx_query_stats.get()
+            if stats is not None and context.statement is not None:
+                stats.record(context.statement, time.perf_counter_ns() - start)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+
+    def instrument_pool(self, engine: "Engine") -> None:
+        """记录连接的建立和关闭, 用于计算连接年龄."""
+        connections = self.pool_stats.connections
+
+        def on_connect(dbapi_connection: Any, connection_record: "ConnectionPoolEntry") -> None:
+            connections[id(dbapi_connection)] = time.monotonic()
+
+        def on_close(dbapi_connection: Any, connection_record: "ConnectionPoolEntry | None" = None) -> None:
+            connections.pop(id(dbapi_connection), None)
+
+        event.listen(engine, "connect", on_connect)
+        event.listen(engine, "close", on_close)
+        event.listen(engine, "detach", on_close)
+
+    def pool_status(self) -> dict[str, Any]:
+        """连接池状态: 连接数、使用中、overflow、等待时间(ns)和连接年龄(s)."""
+        pool = self.engine.pool
+        now = time.monotonic()
+        ages = [now - connected_at for connected_at in self.pool_stats.connections.values()]
+        status: dict[str, Any] = {
+            "checkouts": self.pool_stats.checkouts,
+            "timeouts": self.pool_stats.timeouts,
+            "wait_total": self.pool_stats.wait_total,
+            "wait_max": self.pool_stats.wait_max,
+            "wait_avg": self.pool_stats.wait_total // self.pool_stats.checkouts if self.pool_stats.checkouts else 0,
+            "connections": len(ages),
+            "connection_age_max": max(ages, default=0),
+            "connection_age_avg": sum(ages) / len(ages) if ages else 0,
+        }
+        if isinstance(pool, QueuePool):
+            status.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+            )
+        return status
+
+    def dispose_after_fork(self) -> None:
+        """进程 fork 后丢弃从父进程继承的连接, 不关闭它们以免影响父进程, 之后按需重新建立."""
+        if hasattr(self, "engine"):
+            self.engine.dispose(close=False)
+        for engine in getattr(self, "shard_engines", {}).values():
+            engine.dispose(close=False)
+        self.pool_stats.reset()
+
+    def warm_up(self, count: int | None = None) -> None:
+        """预先建立连接放入连接池, 避免首批请求等待建立连接, 在 worker 启动后调用."""
+        count = self.app.config["DB_POOL_WARMUP"] if count is None else count
+        connections: list[Connection] = []
+        try:
+            for _ in range(count):
+                connections.append(self.engine.connect())
+        except SQLAlchemyError as e:
+            db_logger.warning("DB warm up failed", error=str(e))
+        finally:
+            for connection in connections:
+                connection.close()
 
     def connect(self) -> "Session":
         """生成新的 session."""
@@ -46,6 +337,13 @@ class DB:
         # session 可以看作是本地缓存
         return self.Session()
 
+    def shard_session(self, name: str) -> "Session":
+        """生成连接到指定分片的新 session."""
+        try:
+            return self.shard_sessions[name]()
+        except KeyError:
+            raise ValueError(f"Unknown shard: {name}, check DB_SHARDS") from None
+
     def teardown_request(self, exception: BaseException | None) -> None:
         try:
             session = ctx_session.get()
@@ -53,10 +351,22 @@ class DB:
             ctx_session.reset(self.token)
         except LookupError:
             pass
+        if "query_stats_token" in g:
+            ctx_query_stats.reset(g.pop("query_stats_token"))
 
     def before_request(self) -> None:
         # 每次 request 创建新的 session 确保事务正确
         self.token = ctx_session.set(self.connect())
+        # 每次 request 重新统计 SQL, 由 Logger 写入 access 日志
+        g.query_stats = QueryStats()
+        g.query_stats_token = ctx_query_stats.set(g.query_stats)
+
+    def after_request(self, response: Response) -> Response:
+        stats: QueryStats | None = g.get("query_stats")
+        if stats is not None:
+            for shape, times in stats.repeated(self.app.config["DB_N_PLUS_ONE_THRESHOLD"]).items():
+                db_logger.warning("N+1 query detected", statement=shape, times=times)
+        return response
 
 
 db = DB()
@@ -0,0 +1,87 @@
+"""批量加载器(dataloader 模式).
+
+视图中循环调用 `get_by_id` 会产生 N+1 查询. 使用 Loader 时先登记所有需要的 id,
+第一次取值时才用一条 `WHERE id IN (...)` 查询一次性加载:
+
+```python
+loader = User.loader()
+authors = [loader.load(article.author_id) for article in articles]  # 不查询
+items = [{**article.to_dict(), "author": author.get()} for article, author in zip(articles, authors)]  # 只查询一次
+```
+
+同一请求中 `User.loader()` 返回同一个 Loader, 已加载的 row 会被复用.
+不在请求中(命令行、celery 任务等只有 app context)时每次返回新的 Loader, 需要复用时自行保存, 避免长时间运行的任务读到旧数据.
+"""
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from flask import g, has_request_context
+
+if TYPE_CHECKING:
+    from .model import BaseModel
+
+T = TypeVar("T", bound="BaseModel")
+
+
+class Deferred(Generic[T]):
+    """已登记但可能尚未加载的 row."""
+
+    __slots__ = ("loader", "id")
+
+    def __init__(self, loader: "Loader[T]", id: int) -> None:
+        self.loader = loader
+        self.id = id
+
+    def get(self) -> T | None:
+        return self.loader.get(self.id)
+
+
+class Loader(Generic[T]):
+    def __init__(self, model: type[T]) -> None:
+        self.model = model
+        # dict 保持登记顺序
+        self._pending: dict[int, None] = {}
+        self._loaded: dict[int, T | None] = {}
+
+    def load(self, id: int) -> Deferred[T]:
+        """登记 id, 在第一次 `get` 时与其他已登记的 id 一起加载."""
+        if id not in self._loaded:
+            self._pending[id] = None
+        return Deferred(self, id)
+
+    def load_many(self, ids: Iterable[int]) -> list[Deferred[T]]:
+        return [self.load(id) for id in ids]
+
+    def get(self, id: int) -> T | None:
+        if id not in self._loaded:
+            self._pending[id] = None
+            self.dispatch()
+        return self._loaded[id]
+
+    def get_many(self, ids: Iterable[int]) -> list[T | None]:
+        return [deferred.get() for deferred in self.load_many(ids)]
+
+    def prime(self, row: T) -> None:
+        """将已查询到的 row 放入加载器, 避免重复查询."""
+        self._loaded[row.id] = row
+        self._pending.pop(row.id, None)
+
+    def dispatch(self) -> None:
+        """一次查询加载所有已登记的 id."""
+        if not self._pending:
+            return
+        ids = list(self._pending)
+        self._pending.clear()
+        for id, row in zip(ids, self.model.get_by_ids(ids), strict=True):
+            self._loaded[id] = row
+
+
+def get_loader(model: type[T]) -> Loader[T]:
+    """获得当前请求中 model 的 Loader, 不在请求中时每次返回新的 Loader."""
+    if not has_request_context():
+        return Loader(model)
+    loaders: dict[type[Any], Loader[Any]] = g.setdefault("loaders", {})
+    loader = loaders.get(model)
+    if loader is None:
+        loader = loaders[model] = Loader(model)
+    return loader
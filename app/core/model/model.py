@@ -1,16 +1,25 @@
 import re
-from dataclasses import asdict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import fields
 from datetime import datetime
-from typing import TYPE_CHECKING, Annotated, Any, Self
+from functools import lru_cache, partial
+from operator import attrgetter
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar, Self
 
 from sqlalchemy import BigInteger, delete, func, select, update
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column
 
 if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
     from sqlalchemy.sql.dml import Delete, Update
     from sqlalchemy.sql.selectable import Select
 
-from . import session
+from . import db, session
+from .aio import async_db
+from .cache import query_cache
+from .loader import Loader, get_loader
+from .shard import Sharding
+from .snowflake import snowflake
 
 
 class TableNamer:
@@ -25,6 +34,60 @@ class TableNamer:
         return getattr(objtype, "__tablename__", None)
 
 
+class Serializer:
+    """Model 的序列化器, 每个 Model 类只构建一次.
+
+    初始化时收集 dataclass 字段和 property, 并按 include/exclude 缓存(LRU)投影后的字段列表,
+    序列化时只做属性读取, 不再像 `dataclasses.asdict` 那样递归深拷贝.
+    """
+
+    def __init__(self, model: type["BaseModel"]) -> None:
+        names = [f.name for f in fields(model)]
+        for klass in reversed(model.__mro__):
+            for key, value in vars(klass).items():
+                if isinstance(value, property) and key not in names:
+                    names.append(key)
+        self.names: tuple[str, ...] = tuple(names)
+        # 调用方可以传入任意 include/exclude, 只缓存最近使用的投影
+        self._project = lru_cache(maxsize=128)(self._build_projection)
+
+    def projection(self, include: Iterable[str] | None = None, exclude: Iterable[str] | None = None) -> tuple[str, ...]:
+        """获得投影后的字段名, include 为 None 时表示全部字段, 为空时表示没有字段."""
+        # include=None 和 include=[] 的含义不同, 不能使用同一个 key
+        return self._project(
+            None if include is None else frozenset(include),
+            None if exclude is None else frozenset(exclude),
+        )
+
+    def _build_projection(self, included: frozenset[str] | None, excluded: frozenset[str] | None) -> tuple[str, ...]:
+        return tuple(
+            name
+            for name in self.names
+            if (included is None or name in included) and (excluded is None or name not in excluded)
+        )
+
+    def dump(
+        self, obj: "BaseModel", include: Iterable[str] | None = None, exclude: Iterable[str] | None = None
+    ) -> dict[str, Any]:
+        names = self.projection(include, exclude)
+        if not names:
+            return {}
+        if len(names) == 1:
+            return {names[0]: getattr(obj, names[0])}
+        return dict(zip(names, attrgetter(*names)(obj), strict=True))
+
+    def dump_many(
+        self, objs: Iterable["BaseModel"], include: Iterable[str] | None = None, exclude: Iterable[str] | None = None
+    ) -> list[dict[str, Any]]:
+        names = self.projection(include, exclude)
+        if not names:
+            return [{} for _ in objs]
+        if len(names) == 1:
+            return [{names[0]: getattr(obj, names[0])} for obj in objs]
+        getter = attrgetter(*names)
+        return [dict(zip(names, getter(obj), strict=True)) for obj in objs]
+
+
 class BaseModel(MappedAsDataclass, DeclarativeBase):
     """BaseModel 创建时(也就是 DeclarativeBase 子类化时)会创建 register(包括 metadata 和 mapper).
 
@@ -32,9 +95,19 @@ class BaseModel(MappedAsDataclass, DeclarativeBase):
     """
 
     __tablename__ = TableNamer()
+    # 是否缓存 get_by_attr/get_all/count 的查询结果, 见 `app.core.model.cache`
+    __query_cache__: ClassVar[bool] = False
+    # 是否在创建实例时用 Snowflake 分配 id(不依赖 AUTO_INCREMENT), 见 `app.core.model.snowflake`
+    __snowflake__: ClassVar[bool] = False
+    # 水平分片配置, 见 `app.core.model.shard`
+    __sharding__: ClassVar[Sharding | None] = None
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, init=False)
 
+    def __post_init__(self) -> None:
+        if self.__snowflake__:
+            self.id = snowflake.next_id()
+
     def change(self, data: dict[str, Any]) -> None:
         for key, value in data.items():
             if hasattr(self, key):
@@ -42,37 +115,185 @@ class BaseModel(MappedAsDataclass, DeclarativeBase):
 
     def save(self) -> Self:
         """新增或修改时保存到数据库中."""
+        if self.__sharding__ is not None:
+            return self.__sharding__.save(self)
         with session:
             session.add(self)
             session.commit()
             session.refresh(self)
             return self
 
+    @classmethod
+    def save_all(cls, rows: Sequence[Self]) -> list[Self]:
+        """批量新增或修改, 在一个事务中提交.
+
+        id 已经分配(`__snowflake__`)时 SQLAlchemy 会合并为批量 INSERT, 不需要逐行取回自增 id.
+        """
+        if cls.__sharding__ is not None:
+            return cls.__sharding__.save_all(rows)
+        with session:
+            session.add_all(rows)
+            session.flush()
+            ids = [row.id for row in rows]
+            session.commit()
+            # 一次查询刷新所有已过期的实例, 代替逐行 refresh
+            session.scalars(select(cls).where(cls.id.in_(ids))).all()
+            return list(rows)
+
     @classmethod
     def get_by_id(cls, id: int) -> Self | None:
         """根据 id 获得 row."""
+        if cls.__sharding__ is not None:
+            return cls.__sharding__.get_by_id(cls, id)
         with session:
             return session.get(cls, id)
 
+    @classmethod
+    def get_by_ids(cls, ids: Sequence[int]) -> list[Self | None]:
+        """根据多个 id 一次查询获得 rows, 按 ids 的顺序返回, 不存在的 id 对应 None.
+
+        Examples:
+        >>> User.get_by_ids([3, 1, 404])
+        [User(id=3, ...), User(id=1, ...), None]
+        """
+        if not ids:
+            return []
+        if cls.__sharding__ is not None:
+            rows = cls.__sharding__.get_by_ids(cls, ids)
+        else:
+            with session:
+                rows = session.scalars(select(cls).where(cls.id.in_(set(ids)))).all()
+        found = {row.id: row for row in rows}
+        return [found.get(id) for id in ids]
+
+    @classmethod
+    def loader(cls) -> "Loader[Self]":
+        """获得当前请求中该 model 的批量加载器, 见 `Loader`."""
+        return get_loader(cls)
+
+    @classmethod
+    def fetch(cls, statement: "Select[Any]") -> list[Any]:
+        """执行查询并返回 scalars 列表, 开启 `__query_cache__` 时优先从查询缓存读取.
+
+        分片 model 在所有分片上执行后拼接结果, 见 `Sharding.fetch`.
+        """
+        if cls.__sharding__ is not None:
+            return cls.__sharding__.fetch(statement)
+
+        def load() -> list[Any]:
+            with session:
+                return list(session.scalars(statement).all())
+
+        if cls.__query_cache__:
+            return query_cache.fetch(statement, load)
+        return load()
+
     @classmethod
     def get_by_attr(cls, *args: Any, **kwargs: Any) -> Self | None:
         """根据属性获得 row."""
-        with session:
-            return session.scalars(select(cls).where(*args).filter_by(**kwargs)).first()
+        if cls.__sharding__ is not None:
+            return cls.__sharding__.get_by_attr(cls, *args, **kwargs)
+        rows = cls.fetch(select(cls).where(*args).filter_by(**kwargs).limit(1))
+        return rows[0] if rows else None
 
     @classmethod
     def get_all(cls, page: int = 0, count: int = 10, *args: Any, **kwargs: Any) -> list[Self]:
-        with session:
-            statement = select(cls).where(*args).filter_by(**kwargs).offset(page * count).limit(count)
-            return list(session.scalars(statement).all())
+        if cls.__sharding__ is not None:
+            return cls.__sharding__.get_all(cls, page, count, *args, **kwargs)
+        statement = select(cls).where(*args).filter_by(**kwargs).offset(page * count).limit(count)
+        return cls.fetch(statement)
+
+    @classmethod
+    def iter_chunks(cls, *args: Any, chunk_size: int = 1000, **kwargs: Any) -> Iterator[list[Self]]:
+        """按 id 分批遍历全表(keyset 分页), 每批最多 chunk_size 行.
+
+        每批使用独立的 session 和服务端游标, 取完即归还连接, 迭代过程中不会一直占用连接池,
+        内存占用只与 chunk_size 有关.
+
+        Examples:
+        >>> for users in User.iter_chunks(User.is_deleted == 0, chunk_size=500):
+        ...     ...
+        """
+        if cls.__sharding__ is not None:
+            # 逐个分片遍历, 只在分片内按 id 有序
+            for shard in cls.__sharding__.shards_for(kwargs):
+                yield from cls._iter_chunks(partial(db.shard_session, shard), args, kwargs, chunk_size)
+            return
+        yield from cls._iter_chunks(db.connect, args, kwargs, chunk_size)
+
+    @classmethod
+    def _iter_chunks(
+        cls,
+        connect: Callable[[], "Session"],
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        chunk_size: int,
+    ) -> Iterator[list[Self]]:
+        last_id: int | None = None
+        while True:
+            statement = select(cls).where(*args).filter_by(**kwargs).order_by(cls.id).limit(chunk_size)
+            if last_id is not None:
+                statement = statement.where(cls.id > last_id)
+            statement = statement.execution_options(stream_results=True, yield_per=chunk_size)
+            with connect() as _session:
+                rows = list(_session.scalars(statement))
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1].id
+
+    @classmethod
+    def iter_all(cls, *args: Any, chunk_size: int = 1000, **kwargs: Any) -> Iterator[Self]:
+        """逐行遍历全表, 见 `iter_chunks`."""
+        for rows in cls.iter_chunks(*args, chunk_size=chunk_size, **kwargs):
+            yield from rows
 
     @classmethod
     def count(cls, *args: Any, **kwargs: Any) -> int:
         """根据条件统计数量."""
-        with session:
-            statement = select(func.count(cls.id)).where(*args).filter_by(**kwargs)
-            result = session.execute(statement)
-            return result.scalar() or 0
+        if cls.__sharding__ is not None:
+            return cls.__sharding__.count(cls, *args, **kwargs)
+        rows = cls.fetch(select(func.count(cls.id)).where(*args).filter_by(**kwargs))
+        return rows[0] if rows else 0
+
+    @classmethod
+    def _check_async(cls) -> None:
+        if cls.__sharding__ is not None:
+            raise TypeError(f"{cls.__name__} is sharded, async queries are not supported")
+
+    async def asave(self) -> Self:
+        """`save` 的异步版本."""
+        self._check_async()
+        async with async_db.connect() as _session:
+            _session.add(self)
+            await _session.commit()
+            await _session.refresh(self)
+            return self
+
+    @classmethod
+    async def aget_by_id(cls, id: int) -> Self | None:
+        """`get_by_id` 的异步版本."""
+        cls._check_async()
+        async with async_db.connect() as _session:
+            return await _session.get(cls, id)
+
+    @classmethod
+    async def aget_all(cls, page: int = 0, count: int = 10, *args: Any, **kwargs: Any) -> list[Self]:
+        """`get_all` 的异步版本."""
+        cls._check_async()
+        statement = select(cls).where(*args).filter_by(**kwargs).offset(page * count).limit(count)
+        async with async_db.connect() as _session:
+            return list((await _session.scalars(statement)).all())
+
+    @classmethod
+    async def acount(cls, *args: Any, **kwargs: Any) -> int:
+        """`count` 的异步版本."""
+        cls._check_async()
+        statement = select(func.count(cls.id)).where(*args).filter_by(**kwargs)
+        async with async_db.connect() as _session:
+            return (await _session.scalar(statement)) or 0
 
     @classmethod
     def select(cls) -> "Select[Any]":
@@ -106,23 +327,35 @@ class BaseModel(MappedAsDataclass, DeclarativeBase):
         """
         return delete(cls)
 
-    def to_dict(self, exclude_field: set[str] | None = None) -> dict[str, Any]:
-        self.__exclude_field = exclude_field or set()
-        res = asdict(self, dict_factory=self.dict_factory)
-        members = vars(self.__class__).items()
-        for _k, v in members:
-            if isinstance(v, property):
-                res[_k] = getattr(self, _k)
-        return res
-
-    def dict_factory(self, items: list[tuple[str, Any]]) -> dict[str, Any]:
-        result = {}
-        for item in items:
-            key, value = item
-            if self.__exclude_field and key in self.__exclude_field:
-                continue
-            result[key] = value
-        return result
+    @classmethod
+    def serializer(cls) -> Serializer:
+        """获得该 Model 类的序列化器(首次调用时构建)."""
+        serializer = cls.__dict__.get("_serializer")
+        if serializer is None:
+            serializer = Serializer(cls)
+            # 绕过 DeclarativeBase 元类对类属性赋值的拦截
+            type.__setattr__(cls, "_serializer", serializer)
+        return serializer
+
+    def to_dict(self, exclude_field: set[str] | None = None, include_field: set[str] | None = None) -> dict[str, Any]:
+        """转换为 dict, 包括字段和 property.
+
+        Args:
+            exclude_field (set[str], optional): 排除的字段.
+            include_field (set[str], optional): 只包括的字段, 默认全部.
+        """
+        return self.serializer().dump(self, include_field, exclude_field)
+
+    @classmethod
+    def to_dicts(
+        cls, rows: Iterable[Self], exclude_field: set[str] | None = None, include_field: set[str] | None = None
+    ) -> list[dict[str, Any]]:
+        """批量转换为 dict, 列表接口使用.
+
+        Examples:
+        >>> User.to_dicts(User.get_all(), exclude_field={"password"})
+        """
+        return cls.serializer().dump_many(rows, include_field, exclude_field)
 
 
 # custom type alias
@@ -0,0 +1,201 @@
+"""水平分片.
+
+model 声明分片键和分片策略后, `get_by_id`/`get_by_attr`/`save` 按分片键路由到对应分片,
+无法确定分片的查询和 `get_all`/`count` 并行查询所有分片后合并结果.
+`fetch` 在所有分片上执行同一语句后拼接结果, `iter_chunks`/`iter_all` 逐个分片遍历.
+
+```python
+# DB_SHARDS={"user_0": "mysql+pymysql://...", "user_1": "mysql+pymysql://..."}
+class User(BaseModel):
+    __snowflake__ = True  # 分片键为 id 时需要在写入前分配 id
+    __sharding__ = Sharding("id", HashShard(["user_0", "user_1"]))
+```
+
+分片 model 不使用查询缓存, 不支持跨分片事务, 也不支持异步查询(`asave`/`aget_by_id` 等).
+"""
+import bisect
+import heapq
+import os
+import zlib
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from sqlalchemy import func, select
+
+from .db import db
+
+if TYPE_CHECKING:
+    from sqlalchemy import Select
+    from sqlalchemy.orm import Session
+
+    from .model import BaseModel
+
+T = TypeVar("T")
+M = TypeVar("M", bound="BaseModel")
+
+class _LazyExecutor:
+    """首次使用时创建的线程池. fork 出的子进程不能使用父进程的线程池, 按进程重新创建.
+
+    gevent 下线程会被替换为协程.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self.executor: ThreadPoolExecutor | None = None
+        self.pid = 0
+        self.lock = Lock()
+
+    def get(self) -> ThreadPoolExecutor:
+        if self.executor is None or self.pid != os.getpid():
+            with self.lock:
+                if self.executor is None or self.pid != os.getpid():
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard")
+                    self.pid = os.getpid()
+        return self.executor
+
+    def map(self, fn: Callable[[Any], T], items: Iterable[Any]) -> Iterator[T]:
+        return self.get().map(fn, items)
+
+
+_executor = _LazyExecutor(max_workers=16)
+
+
+class ShardStrategy:
+    shards: Sequence[str]
+
+    def shard_for(self, value: Any) -> str:
+        raise NotImplementedError()
+
+
+class HashShard(ShardStrategy):
+    """按分片键的 crc32 取模.
+
+    整数也先计算哈希: Snowflake id 的低位是毫秒内序号, 大多为 0, 直接取模会集中到同一个分片.
+    """
+
+    def __init__(self, shards: Sequence[str]) -> None:
+        self.shards = list(shards)
+
+    def shard_for(self, value: Any) -> str:
+        data = value.to_bytes(8, "little", signed=True) if isinstance(value, int) else str(value).encode()
+        return self.shards[zlib.crc32(data) % len(self.shards)]
+
+
+class RangeShard(ShardStrategy):
+    """按分片键范围, bounds 为各分片的上界(不包含), 最后一个分片没有上界.
+
+    >>> RangeShard([1_000_000, 2_000_000], ["user_0", "user_1", "user_2"])
+    """
+
+    def __init__(self, bounds: Sequence[Any], shards: Sequence[str]) -> None:
+        if len(shards) != len(bounds) + 1:
+            raise ValueError("len(shards) must be len(bounds) + 1")
+        self.bounds = list(bounds)
+        self.shards = list(shards)
+
+    def shard_for(self, value: Any) -> str:
+        return self.shards[bisect.bisect_right(self.bounds, value)]
+
+
+class Sharding:
+    def __init__(self, key: str, strategy: ShardStrategy) -> None:
+        self.key = key
+        self.strategy = strategy
+
+    def shard_for(self, value: Any) -> str:
+        return self.strategy.shard_for(value)
+
+    def shards_for(self, kwargs: dict[str, Any]) -> list[str]:
+        """条件中包含分片键时只有一个分片, 否则为所有分片."""
+        if self.key in kwargs:
+            return [self.shard_for(kwargs[self.key])]
+        return list(self.strategy.shards)
+
+    def scatter(self, query: Callable[["Session"], T]) -> list[T]:
+        """在所有分片上并行执行 query, 按分片顺序返回结果."""
+
+        def run(shard: str) -> T:
+            with db.shard_session(shard) as _session:
+                return query(_session)
+
+        return list(_executor.map(run, self.strategy.shards))
+
+    def get_by_id(self, model: type[M], id: int) -> M | None:
+        if self.key == "id":
+            with db.shard_session(self.shard_for(id)) as _session:
+                return _session.get(model, id)
+        return next((row for row in self.scatter(lambda s: s.get(model, id)) if row is not None), None)
+
+    def get_by_ids(self, model: type[M], ids: Sequence[int]) -> list[M]:
+        """分片键为 id 时按分片分组, 只查询相关分片, 每个分片一次查询."""
+        if self.key != "id":
+            statement = select(model).where(model.id.in_(set(ids)))
+            return [row for rows in self.scatter(lambda s: s.scalars(statement).all()) for row in rows]
+        groups: dict[str, set[int]] = {}
+        for id in ids:
+            groups.setdefault(self.shard_for(id), set()).add(id)
+
+        def run(item: tuple[str, set[int]]) -> list[M]:
+            shard, group = item
+            with db.shard_session(shard) as _session:
+                return list(_session.scalars(select(model).where(model.id.in_(group))).all())
+
+        return [row for rows in _executor.map(run, groups.items()) for row in rows]
+
+    def fetch(self, statement: "Select[Any]") -> list[Any]:
+        """在所有分片上执行语句, 按分片顺序拼接结果. 排序、limit 和聚合只在各分片内生效."""
+        return [row for rows in self.scatter(lambda s: list(s.scalars(statement).all())) for row in rows]
+
+    def get_by_attr(self, model: type[M], *args: Any, **kwargs: Any) -> M | None:
+        statement = select(model).where(*args).filter_by(**kwargs).limit(1)
+        if self.key in kwargs:
+            with db.shard_session(self.shard_for(kwargs[self.key])) as _session:
+                return _session.scalars(statement).first()
+        rows = self.scatter(lambda s: s.scalars(statement).first())
+        return next((row for row in rows if row is not None), None)
+
+    def get_all(self, model: type[M], page: int, count: int, *args: Any, **kwargs: Any) -> list[M]:
+        """各分片按 id 排序取前 (page + 1) * count 行, 归并后分页."""
+        if self.key in kwargs:
+            statement = select(model).where(*args).filter_by(**kwargs).order_by(model.id)
+            with db.shard_session(self.shard_for(kwargs[self.key])) as _session:
+                return list(_session.scalars(statement.offset(page * count).limit(count)).all())
+        statement = select(model).where(*args).filter_by(**kwargs).order_by(model.id).limit((page + 1) * count)
+        results = self.scatter(lambda s: list(s.scalars(statement).all()))
+        merged = heapq.merge(*results, key=lambda row: row.id)
+        return list(merged)[page * count : (page + 1) * count]
+
+    def count(self, model: type["BaseModel"], *args: Any, **kwargs: Any) -> int:
+        statement = select(func.count(model.id)).where(*args).filter_by(**kwargs)
+        if self.key in kwargs:
+            with db.shard_session(self.shard_for(kwargs[self.key])) as _session:
+                return _session.scalar(statement) or 0
+        return sum(self.scatter(lambda s: s.scalar(statement) or 0))
+
+    def save(self, row: M) -> M:
+        value = getattr(row, self.key)
+        if value is None:
+            raise ValueError(f"Shard key {self.key} must be set before save")
+        with db.shard_session(self.shard_for(value)) as _session:
+            _session.add(row)
+            _session.commit()
+            _session.refresh(row)
+            return row
+
+    def save_all(self, rows: Sequence[M]) -> list[M]:
+        """按分片分组, 每个分片一个事务."""
+        groups: dict[str, list[M]] = {}
+        for row in rows:
+            value = getattr(row, self.key)
+            if value is None:
+                raise ValueError(f"Shard key {self.key} must be set before save")
+            groups.setdefault(self.shard_for(value), []).append(row)
+        for shard, group in groups.items():
+            with db.shard_session(shard) as _session:
+                _session.add_all(group)
+                _session.commit()
+                for row in group:
+                    _session.refresh(row)
+        return list(rows)
@@ -0,0 +1,192 @@
+"""Snowflake 64 位 ID 生成.
+
+结构: 1 位符号(0) + 41 位毫秒时间戳 + 10 位 worker id + 12 位序列号, 按时间递增,
+每个 worker 每毫秒最多 4096 个 ID. worker id 通过 redis 租用, 保证同一时刻不会有两个进程使用相同的 worker id.
+
+model 开启后在创建实例时即分配 id, 不需要先写入数据库, 关联数据可以一次批量写入:
+
+```python
+class Article(BaseModel):
+    __snowflake__ = True
+
+lease = WorkerIdLease(redis_client)
+snowflake.init(lease.acquire, lease.is_valid)  # 首次生成 ID 时才租用, 租约失效后重新租用
+article = Article(...)  # article.id 已经分配
+```
+"""
+import atexit
+import contextlib
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from datetime import timedelta
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from redis import Redis
+
+    from task.lock import RenewLock
+
+    BaseRedis = Redis[bytes]
+
+EPOCH = 1672531200000  # 2023-01-01 00:00:00 UTC, 毫秒
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class ClockMovedBackwardsError(Exception):
+    """系统时间回拨过多."""
+
+
+class SnowflakeId(NamedTuple):
+    timestamp: int  # unix 毫秒
+    worker_id: int
+    sequence: int
+
+
+class Snowflake:
+    def __init__(self, worker_id: int | Callable[[], int] | None = None, epoch: int = EPOCH) -> None:
+        self.epoch = epoch
+        self._lock = threading.Lock()
+        self._last_timestamp = -1
+        self._sequence = 0
+        self._worker_id: int | None = None
+        self._worker_id_factory: Callable[[], int] | None = None
+        self._worker_id_valid: Callable[[], bool] | None = None
+        if worker_id is not None:
+            self.init(worker_id)
+        # fork 出的子进程需要重新租用 worker id, 否则会与父进程生成相同的 ID
+        os.register_at_fork(after_in_child=self._reset)
+
+    def init(self, worker_id: int | Callable[[], int], is_valid: Callable[[], bool] | None = None) -> None:
+        """设置 worker id, 或者获取 worker id 的函数(首次生成 ID 时调用).
+
+        is_valid 返回 False 时(如租约已失效), 生成 ID 前重新调用 worker_id 获取.
+        """
+        if callable(worker_id):
+            self._worker_id_factory = worker_id
+            self._worker_id_valid = is_valid
+            self._worker_id = None
+        else:
+            self._worker_id = self._check_worker_id(worker_id)
+
+    @staticmethod
+    def _check_worker_id(worker_id: int) -> int:
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        return worker_id
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._last_timestamp = -1
+        self._sequence = 0
+        if self._worker_id_factory is not None:
+            self._worker_id = None
+
+    @property
+    def worker_id(self) -> int:
+        if self._worker_id is not None and self._worker_id_valid is not None and not self._worker_id_valid():
+            # 其他进程可能已经使用这个 worker id, 不能继续生成
+            self._worker_id = None
+        if self._worker_id is None:
+            if self._worker_id_factory is None:
+                raise RuntimeError("Snowflake worker id is not set, call snowflake.init() first")
+            self._worker_id = self._check_worker_id(self._worker_id_factory())
+        return self._worker_id
+
+    def next_id(self) -> int:
+        with self._lock:
+            worker_id = self.worker_id
+            timestamp = time.time_ns() // 1_000_000
+            if timestamp < self._last_timestamp:
+                # 时间回拨: 少量回拨时等待追上, 否则报错避免生成重复 ID
+                if self._last_timestamp - timestamp > 1000:
+                    raise ClockMovedBackwardsError()
+                timestamp = self._wait_until(self._last_timestamp)
+            if timestamp == self._last_timestamp:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 当前毫秒序列号用尽
+                    timestamp = self._wait_until(self._last_timestamp + 1)
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+            return (
+                ((timestamp - self.epoch) << (WORKER_ID_BITS + SEQUENCE_BITS))
+                | (worker_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+
+    @staticmethod
+    def _wait_until(timestamp: int) -> int:
+        now = time.time_ns() // 1_000_000
+        while now < timestamp:
+            time.sleep((timestamp - now) / 1000)
+            now = time.time_ns() // 1_000_000
+        return now
+
+    def parse(self, id: int) -> SnowflakeId:
+        return SnowflakeId(
+            timestamp=(id >> (WORKER_ID_BITS + SEQUENCE_BITS)) + self.epoch,
+            worker_id=(id >> SEQUENCE_BITS) & MAX_WORKER_ID,
+            sequence=id & MAX_SEQUENCE,
+        )
+
+
+class WorkerIdLease:
+    """通过 redis 租用 worker id.
+
+    从随机位置开始依次尝试 `snowflake:worker:<id>` 锁, 获得后由 `RenewLock` 后台续约, 进程退出时释放.
+    续约失败后 `is_valid` 返回 False, Snowflake 在生成下一个 ID 前重新租用.
+    fork 出的子进程不会释放父进程租用的 worker id.
+    """
+
+    def __init__(
+        self,
+        redis_client: "BaseRedis",
+        prefix: str = "snowflake:worker",
+        expiration: timedelta = timedelta(seconds=60),
+    ) -> None:
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.expiration = expiration
+        self.lock: RenewLock | None = None
+        # 租用 worker id 的进程
+        self.pid: int | None = None
+        atexit.register(self.release)
+
+    def acquire(self) -> int:
+        # 导入 task 包会创建 celery app, 只在真正租用时导入
+        from task.lock import RenewLock
+
+        self.release()
+        start = random.randint(0, MAX_WORKER_ID)  # noqa: S311
+        for offset in range(MAX_WORKER_ID + 1):
+            worker_id = (start + offset) % (MAX_WORKER_ID + 1)
+            lock = RenewLock(f"{self.prefix}:{worker_id}", expiration=self.expiration, redis_client=self.redis_client)
+            if lock.acquire_with_renew():
+                self.lock = lock
+                self.pid = os.getpid()
+                return worker_id
+        raise RuntimeError("No snowflake worker id available")
+
+    def is_valid(self) -> bool:
+        return self.lock is not None and self.pid == os.getpid() and self.lock.is_held()
+
+    def release(self) -> None:
+        """释放当前进程租用的 worker id, 从父进程继承的租约只丢弃不释放."""
+        lock, self.lock = self.lock, None
+        if lock is None or self.pid != os.getpid():
+            return
+        from task.lock import LockNotHoldError, ServerError
+
+        # 租约已经失效时不需要释放
+        with contextlib.suppress(LockNotHoldError, ServerError):
+            lock.release()
+
+
+snowflake = Snowflake()
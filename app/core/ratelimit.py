@@ -0,0 +1,181 @@
+"""基于 redis 的分布式限流(GCRA).
+
+每个 key 只保存一个理论到达时间(TAT), 一次 Lua 调用完成判断和更新. 被拒绝的 key 在本进程中记录到可以重试的时间,
+之前的请求直接拒绝, 不再访问 redis. 超过限制时返回 429 和 `Retry-After` 响应头:
+
+```python
+limiter.init_app(app, redis_client)
+
+@app.post("/sms/code")
+@limiter.limit("1/minute", key=by_mobile)
+@limiter.limit("20/hour", key=by_ip)
+def send_code(): ...
+```
+
+redis 不可用时不限流(fail open).
+"""
+import math
+import re
+import time
+from collections.abc import Callable
+from datetime import timedelta
+from functools import wraps
+from typing import TYPE_CHECKING, NamedTuple, ParamSpec, TypeVar
+
+import redis
+import structlog
+from flask import Flask, request
+from theine.thenie import Cache
+
+from app.core.exception import TooManyRequests
+
+if TYPE_CHECKING:
+    from redis import Redis
+
+    BaseRedis = Redis[bytes]
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+ratelimit_logger: structlog.stdlib.BoundLogger = structlog.get_logger("api.ratelimit")
+
+# KEYS[1]: key; ARGV[1]: 每个请求的间隔(毫秒); ARGV[2]: 周期(毫秒), 即允许的突发量 * 间隔
+# 返回 {是否允许, 需要等待的毫秒数}
+GCRA_SCRIPT = """
+local now_parts = redis.call("time")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call("get", KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if allow_at > now then
+    return {0, allow_at - now}
+end
+redis.call("set", KEYS[1], new_tat, "px", new_tat - now)
+return {1, 0}
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Rate(NamedTuple):
+    limit: int
+    period: int  # 秒
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """解析 `10/minute`、`5/second` 等格式."""
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(second|minute|hour|day)\s*", value)
+        if match is None:
+            raise ValueError(f"Invalid rate: {value}")
+        return cls(int(match[1]), PERIODS[match[2]])
+
+
+def client_ip() -> str:
+    """客户端 IP. 经过 nginx 时取 X-Forwarded-For 的最后一个地址(nginx 添加的, 客户端无法伪造)."""
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return forwarded.rsplit(",", 1)[-1].strip()
+    return request.remote_addr or ""
+
+
+def by_ip() -> str:
+    return f"ip:{client_ip()}"
+
+
+def by_user() -> str:
+    """按当前用户, 未登录时按 IP."""
+    from app.core.auth import current_user
+
+    user = current_user.get()
+    return f"user:{user.id}" if user is not None else by_ip()
+
+
+def by_field(name: str) -> Callable[[], str]:
+    """按请求体(JSON 或表单)中的字段, 没有该字段时按 IP."""
+
+    def key() -> str:
+        data = request.get_json(silent=True) if request.is_json else request.form
+        value = data.get(name) if isinstance(data, dict) else None
+        return f"{name}:{value}" if value else by_ip()
+
+    return key
+
+
+by_mobile = by_field("mobile")
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        self.redis_client: BaseRedis | None = None
+        self.prefix = "ratelimit"
+        self.enabled = True
+        # key -> 可以重试的时间(time.monotonic()), 本地预检查
+        self.blocked = Cache("lru", 10000)
+
+    def init_app(self, app: Flask, redis_client: "BaseRedis") -> None:
+        app.config.setdefault("RATE_LIMIT_ENABLED", True)
+        app.config.setdefault("RATE_LIMIT_PREFIX", "ratelimit")
+        self.enabled = app.config["RATE_LIMIT_ENABLED"]
+        self.prefix = app.config["RATE_LIMIT_PREFIX"]
+        self.redis_client = redis_client
+        app.extensions["ratelimit"] = self
+
+    def hit(self, key: str, rate: Rate) -> float:
+        """记录一次请求, 返回需要等待的秒数, 为 0 时允许."""
+        now = time.monotonic()
+        blocked_until: float | None = self.blocked.get(key, None)
+        if blocked_until is not None and blocked_until > now:
+            return blocked_until - now
+        if self.redis_client is None:
+            return 0
+        interval = rate.period * 1000 / rate.limit
+        try:
+            allowed, wait = self.redis_client.eval(  # type: ignore
+                GCRA_SCRIPT, 1, f"{self.prefix}:{key}", math.ceil(interval), rate.period * 1000
+            )
+        except redis.exceptions.RedisError:
+            ratelimit_logger.warning("rate limiter unavailable", key=key, exc_info=True)
+            return 0
+        if allowed:
+            return 0
+        retry_after = int(wait) / 1000
+        self.blocked.set(key, now + retry_after, timedelta(seconds=retry_after))
+        return retry_after
+
+    def limit(
+        self,
+        rate: str,
+        key: Callable[[], str] = by_ip,
+        scope: str | None = None,
+    ) -> Callable[[Callable[P, R]], Callable[P, R]]:
+        """限流装饰器.
+
+        Args:
+            rate (str): 如 `10/minute`.
+            key (Callable): 从请求中获得限流对象, 见 `by_ip`/`by_user`/`by_mobile`.
+            scope (str, optional): 限流范围, 默认为视图函数名, 相同 scope 的视图共享限额.
+        """
+        parsed = Rate.parse(rate)
+
+        def decorator(func: Callable[P, R]) -> Callable[P, R]:
+            name = scope or f"{func.__module__}.{func.__qualname__}"
+
+            @wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+                if self.enabled:
+                    retry_after = self.hit(f"{name}:{key()}", parsed)
+                    if retry_after > 0:
+                        raise TooManyRequests(headers={"Retry-After": str(math.ceil(retry_after))})
+                return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+limiter = RateLimiter()
@@ -0,0 +1,11 @@
+from typing import TYPE_CHECKING
+
+from redis import Redis
+
+from config import config
+
+if TYPE_CHECKING:
+    BaseRedis = Redis[bytes]
+
+# 单例模式, 连接在第一次使用时建立
+redis_client: "BaseRedis" = Redis.from_url(config.REDIS_URL)
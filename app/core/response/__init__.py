@@ -0,0 +1,13 @@
+from .cache import response_cache
+from .compress import compressor
+from .etag import etag, table_version
+from .stream import stream_model, stream_response
+
+__all__ = (
+    "response_cache",
+    "compressor",
+    "etag",
+    "table_version",
+    "stream_model",
+    "stream_response",
+)
@@ -0,0 +1,72 @@
+"""JSON 编码性能对比.
+
+对比标准库 json 和 orjson 在常见响应上的耗时:
+- 单个对象: `BaseModel.to_dict()` 的输出(包括 datetime)
+- 分页列表: `ResultPageSchema` 形式, 包括 50 个对象
+- 错误响应: `APIException.to_dict()`
+
+```shell
+python -m app.core.response.benchmark
+```
+"""
+import timeit
+from datetime import date, datetime
+from typing import Any
+
+from flask import Flask
+
+from app.core.response.json import OrjsonProvider, StdJSONProvider, orjson
+
+
+def user_dict(id: int) -> dict[str, Any]:
+    now = datetime.now()  # noqa: DTZ005
+    return {
+        "id": id,
+        "username": f"user{id}",
+        "mobile": "13800000000",
+        "role_id": 1,
+        "signature": "这是一段个性签名",
+        "avatar": "https://example.com/avatar.png",
+        "email": None,
+        "last_login": now,
+        "status": 1,
+        "is_deleted": 0,
+        "gender": 2,
+        "birthday": date(2000, 1, 1),
+        "address": "广州",
+        "company": "",
+        "career": "",
+        "home_url": "",
+        "github": "",
+        "create_time": now,
+        "update_time": now,
+        "article_count": 10,
+        "like_count": 100,
+    }
+
+
+PAYLOADS: dict[str, Any] = {
+    "object": user_dict(1),
+    "page": {"page": 0, "count": 50, "total": 1000, "items": [user_dict(i) for i in range(50)]},
+    "error": {"code": 1000, "message": "Parameter Error", "errors": [{"loc": ["name"], "msg": "field required"}]},
+}
+
+
+def main(number: int = 2000) -> None:
+    app = Flask(__name__)
+    providers: dict[str, Any] = {"json": StdJSONProvider(app)}
+    if orjson is not None:
+        providers["orjson"] = OrjsonProvider(app)
+    for name, payload in PAYLOADS.items():
+        results = {
+            provider_name: timeit.timeit(lambda p=provider, o=payload: p.dumps_bytes(o), number=number) / number * 1e6
+            for provider_name, provider in providers.items()
+        }
+        line = ", ".join(f"{provider_name}: {us:.1f}us" for provider_name, us in results.items())
+        if "orjson" in results:
+            line += f", x{results['json'] / results['orjson']:.1f}"
+        print(f"{name:<8} {line}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
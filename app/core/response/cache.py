@@ -0,0 +1,200 @@
+"""整个响应的缓存.
+
+对所有匿名用户都相同的公开接口(列表、配置等), 缓存序列化后的响应体和响应头, 命中时不执行视图函数:
+
+```python
+@app.get("/articles")
+@response_cache.cached(ttl=30, query=["page", "count"], tables=["article"])
+def list_articles(): ...
+
+@app.get("/articles/<int:id>")
+@response_cache.cached(tags=lambda id: [f"article:{id}"])
+def get_article(id: int): ...
+
+response_cache.invalidate([f"article:{id}"])
+```
+
+key 由 endpoint、路径参数和 vary 规则(查询参数、用户角色、请求头)组成, 并包含标签和表的版本号:
+- tags: 标签版本号保存在 `response_cache.versions`, 调用 `invalidate` 递增;
+- tables: 使用查询缓存的表版本号, 通过 session 提交修改后自动递增.
+
+只缓存 GET/HEAD 的 200 响应, 流式响应和设置 cookie 的响应不缓存.
+开启 `compressor` 时同时缓存压缩后的响应体, 每种编码只压缩一次.
+视图函数依赖当前用户时必须 `role=True` 或不使用此缓存, 否则会把一个用户的响应返回给其他用户.
+"""
+import hashlib
+from collections.abc import Callable, Iterable
+from datetime import timedelta
+from functools import wraps
+from typing import TYPE_CHECKING, Any, ClassVar, NamedTuple, ParamSpec, TypeVar
+
+from flask import Flask, Response, current_app, request
+
+from app.core.cache import Manager, Node, VersionStore
+from app.core.cache.serializer import PickleSerializer
+from app.core.model import query_cache
+
+from .compress import compressor
+
+if TYPE_CHECKING:
+    from app.core.cache.typing import STORAGE_NAME, Cache
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+Tags = Iterable[str] | Callable[..., Iterable[str]]
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+class ResponseNode(Node[CachedResponse]):
+    storages: ClassVar[list["Cache | STORAGE_NAME"]] = []
+
+    def __init__(self, digest: str, loader: Callable[[], CachedResponse], ttl: timedelta | None = None) -> None:
+        self.digest = digest
+        self.loader = loader
+        if ttl is not None:
+            self.storages = [  # type: ignore
+                {"storage": storage if isinstance(storage, str) else storage["storage"], "ttl": ttl}
+                for storage in type(self).storages
+            ]
+
+    def key(self) -> str:
+        return self.digest
+
+    def load(self) -> CachedResponse:
+        return self.loader()
+
+
+class _UncacheableError(Exception):
+    """视图函数的响应不能缓存, 直接返回给客户端."""
+
+    def __init__(self, response: Response) -> None:
+        self.response = response
+
+
+class ResponseCache:
+    def __init__(self) -> None:
+        self.versions = VersionStore(prefix="response")
+        self.manager = Manager()
+        self.manager.serializer = PickleSerializer()
+
+    def init_app(self, app: Flask, versions: VersionStore | None = None) -> None:
+        app.config.setdefault("RESPONSE_CACHE_TTL", 60)
+        app.config.setdefault("RESPONSE_CACHE_STORAGES", ["local", "redis"])
+        if versions is not None:
+            self.versions = versions
+        ttl = timedelta(seconds=app.config["RESPONSE_CACHE_TTL"])
+        ResponseNode.storages = [{"storage": name, "ttl": ttl} for name in app.config["RESPONSE_CACHE_STORAGES"]]
+        app.extensions["response_cache"] = self
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """使包含这些标签的响应缓存失效."""
+        self.versions.bump(tags)
+
+    def key(
+        self,
+        kwargs: dict[str, Any],
+        query: bool | Iterable[str],
+        role: bool,
+        headers: Iterable[str],
+        tags: Tags,
+        tables: Iterable[str],
+    ) -> str:
+        if query is True:
+            args = sorted(request.args.items(multi=True))
+        elif query:
+            args = [(name, request.args.getlist(name)) for name in query]
+        else:
+            args = []
+        role_id = None
+        if role:
+            from app.core.auth import current_user
+
+            principal = current_user.get()
+            role_id = principal.role_id if principal is not None else None
+        tag_names = sorted(tags(**kwargs) if callable(tags) else tags)
+        parts = (
+            request.endpoint,
+            sorted((request.view_args or {}).items()),
+            args,
+            role_id,
+            [request.headers.get(name) for name in headers],
+            tag_names,
+            self.versions.get_many(tag_names),
+            query_cache.versions.get_many(list(tables)),
+        )
+        return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    def cached(
+        self,
+        ttl: int | None = None,
+        query: bool | Iterable[str] = True,
+        role: bool = False,
+        headers: Iterable[str] = (),
+        tags: Tags = (),
+        tables: Iterable[str] = (),
+    ) -> Callable[[Callable[P, R]], Callable[P, Response]]:
+        """缓存视图函数的响应.
+
+        Args:
+            ttl (int, optional): 缓存时间(秒), 默认 RESPONSE_CACHE_TTL.
+            query (bool | Iterable[str], optional): 按查询参数区分, True 为全部参数, 也可以指定参数名.
+            role (bool, optional): 按当前用户的角色区分, 未登录为一个角色.
+            headers (Iterable[str], optional): 按这些请求头区分, 如 `Accept-Language`.
+            tags (Iterable[str] | Callable, optional): 标签, 可以是接收视图函数参数的函数.
+            tables (Iterable[str], optional): 依赖的表, 修改后缓存失效.
+        """
+        headers = tuple(headers)
+        tables = sorted(tables)
+        if not isinstance(query, bool):
+            query = sorted(query)
+        if not callable(tags):
+            tags = tuple(tags)
+        expires = timedelta(seconds=ttl) if ttl is not None else None
+
+        def decorator(func: Callable[P, R]) -> Callable[P, Response]:
+            @wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> Response:
+                if request.method not in ("GET", "HEAD"):
+                    return current_app.make_response(func(*args, **kwargs))  # type: ignore
+
+                def load() -> CachedResponse:
+                    response = current_app.make_response(func(*args, **kwargs))  # type: ignore
+                    if response.status_code != 200 or response.is_streamed or "Set-Cookie" in response.headers:
+                        raise _UncacheableError(response)
+                    return CachedResponse(
+                        response.status_code,
+                        [(name, value) for name, value in response.headers.items() if name != "Content-Length"],
+                        response.get_data(),
+                    )
+
+                digest = self.key(kwargs, query, role, headers, tags, tables)
+                try:
+                    cached: CachedResponse = self.manager.get(ResponseNode(digest, load, expires))  # type: ignore
+                except _UncacheableError as e:
+                    return e.response
+                response = current_app.response_class(cached.body, status=cached.status, headers=cached.headers)
+                encoding = compressor.choose(response)
+                if encoding is not None:
+                    # 每种编码压缩一次, 与未压缩的响应一起缓存
+                    variant: CachedResponse = self.manager.get(  # type: ignore
+                        ResponseNode(
+                            f"{digest}:{encoding}",
+                            lambda: cached._replace(body=compressor.compress(cached.body, encoding)),  # type: ignore
+                            expires,
+                        )
+                    )
+                    compressor.apply(response, encoding, variant.body)
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,97 @@
+"""响应压缩.
+
+按请求的 Accept-Encoding 协商 brotli(安装了 brotli 时)或 gzip, 只压缩超过 COMPRESS_MIN_SIZE 的文本类响应:
+
+```python
+compressor.init_app(app)
+```
+
+`response_cache.cached` 缓存的响应会同时缓存压缩后的结果(每种编码一份), 命中时不需要再次压缩.
+压缩后的 ETag 改为弱 ETag, 内容相同但编码不同的响应仍可以通过 `If-None-Match` 验证.
+"""
+import gzip
+from typing import TYPE_CHECKING
+
+from flask import Flask, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+if TYPE_CHECKING:
+    from flask import Response
+
+
+class Compressor:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.min_size = 1024
+        self.mimetypes: frozenset[str] = frozenset()
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        self.encodings = ("gzip",)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+        app.config.setdefault(
+            "COMPRESS_MIMETYPES",
+            ["application/json", "text/html", "text/plain", "text/css", "text/csv", "application/javascript"],
+        )
+        app.config.setdefault("COMPRESS_GZIP_LEVEL", 6)
+        # brotli 的 quality 越高压缩越慢, 4 与 gzip 6 耗时相近而压缩率更高
+        app.config.setdefault("COMPRESS_BROTLI_QUALITY", 4)
+        self.min_size = app.config["COMPRESS_MIN_SIZE"]
+        self.mimetypes = frozenset(app.config["COMPRESS_MIMETYPES"])
+        self.gzip_level = app.config["COMPRESS_GZIP_LEVEL"]
+        self.brotli_quality = app.config["COMPRESS_BROTLI_QUALITY"]
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self.enabled = True
+        app.after_request(self.after_request)
+        app.extensions["compressor"] = self
+
+    def negotiate(self) -> str | None:
+        """按 Accept-Encoding 选择编码, 质量相同时优先 brotli."""
+        accept = request.accept_encodings
+        best = max(self.encodings, key=accept.quality)
+        return best if accept.quality(best) > 0 else None
+
+    def choose(self, response: "Response") -> str | None:
+        """响应需要压缩时返回使用的编码."""
+        if (
+            not self.enabled
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in self.mimetypes
+        ):
+            return None
+        if len(response.get_data()) < self.min_size:
+            return None
+        # 是否压缩与 Accept-Encoding 有关, 即使不压缩也需要声明
+        response.vary.add("Accept-Encoding")
+        return self.negotiate()
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)  # type: ignore
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def apply(self, response: "Response", encoding: str, data: bytes) -> "Response":
+        """使用压缩后的数据替换响应体."""
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        tag, weak = response.get_etag()
+        if tag is not None and not weak:
+            response.set_etag(tag, weak=True)
+        return response
+
+    def after_request(self, response: "Response") -> "Response":
+        encoding = self.choose(response)
+        if encoding is None:
+            return response
+        return self.apply(response, encoding, self.compress(response.get_data(), encoding))
+
+
+compressor = Compressor()
@@ -0,0 +1,112 @@
+"""ETag 和条件请求.
+
+- 提供 version 时, ETag 由版本号和请求路径计算, `If-None-Match` 匹配时直接返回 304, 不执行视图函数;
+- 否则执行视图函数后按响应体的 blake2b 计算 ETag, 匹配时返回 304(节省带宽, 不节省计算).
+
+```python
+@app.get("/roles")
+@etag(version=table_version("role"), cache_control="public, max-age=0, must-revalidate")
+def list_roles(): ...
+
+@app.get("/me/articles")
+@etag(version=table_version("article"), user=True, cache_control="private, no-cache")
+def my_articles(): ...
+```
+
+版本号相同时 ETag 也相同, 与当前用户无关. 视图函数依赖当前用户时必须 `user=True`(或按角色区分时 `role=True`),
+ETag 会包含用户 id(角色 id)并添加 `Vary: Authorization`; 此时 Cache-Control 不能是 `public`,
+否则共享缓存可能把一个用户的响应体用于另一个用户.
+"""
+import hashlib
+from collections.abc import Callable
+from functools import wraps
+from typing import Any, ParamSpec, TypeVar
+
+from flask import Response, current_app, request
+
+from app.core.model import query_cache
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+Version = Callable[..., Any]
+
+
+def table_version(*tables: str) -> Version:
+    """按表的版本号(见 `app.core.model.cache`), 通过 session 提交修改后版本号递增."""
+    names = sorted(tables)
+
+    def version(**kwargs: Any) -> list[int]:
+        return query_cache.versions.get_many(names)
+
+    return version
+
+
+def compute_etag(*parts: Any) -> str:
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def body_etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def current_identity(user: bool, role: bool) -> tuple[int | None, int | None]:
+    """当前用户的 id 和角色 id, 未登录时为 None."""
+    from app.core.auth import current_user
+
+    principal = current_user.get()
+    if principal is None:
+        return None, None
+    return (principal.id if user else None), (principal.role_id if role else None)
+
+
+def etag(
+    version: Version | None = None,
+    cache_control: str | None = "no-cache",
+    user: bool = False,
+    role: bool = False,
+) -> Callable[[Callable[P, R]], Callable[P, Response]]:
+    """为 GET/HEAD 响应添加 ETag 和 Cache-Control.
+
+    Args:
+        version (Callable, optional): 接收视图函数的参数, 返回当前数据的版本, 相同版本(和相同用户)的响应必须相同.
+        cache_control (str, optional): Cache-Control 响应头, 默认 `no-cache`(可以缓存, 使用前需要验证).
+        user (bool, optional): 响应依赖当前用户, ETag 按用户区分.
+        role (bool, optional): 响应依赖当前用户的角色, ETag 按角色区分.
+    """
+    personal = user or role
+    if personal and cache_control is not None and "public" in cache_control.lower():
+        raise ValueError("Cache-Control of a user-dependent response can not be public")
+
+    def decorator(func: Callable[P, R]) -> Callable[P, Response]:
+        @wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> Response:
+            if request.method not in ("GET", "HEAD"):
+                return current_app.make_response(func(*args, **kwargs))  # type: ignore
+            tag = None
+            if version is not None:
+                identity = current_identity(user, role) if personal else None
+                tag = compute_etag(request.endpoint, request.full_path, identity, version(**kwargs))
+                # 压缩后为弱 ETag, If-None-Match 使用弱比较
+                if request.if_none_match.contains_weak(tag):
+                    response = current_app.response_class(status=304)
+                    return finish(response, tag, cache_control, personal)
+            response = current_app.make_response(func(*args, **kwargs))  # type: ignore
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            if tag is None:
+                tag = body_etag(response.get_data())
+            return finish(response, tag, cache_control, personal).make_conditional(request)
+
+        return wrapper
+
+    return decorator
+
+
+def finish(response: Response, tag: str, cache_control: str | None, personal: bool = False) -> Response:
+    response.set_etag(tag)
+    if personal:
+        response.vary.add("Authorization")
+    if cache_control is not None:
+        response.headers["Cache-Control"] = cache_control
+    return response
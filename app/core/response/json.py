@@ -0,0 +1,83 @@
+"""JSON provider.
+
+安装了 orjson 时使用 orjson 编码, 否则使用标准库 json. 两者输出一致:
+datetime/date 为 ISO 8601 格式(与 `stream_model` 导出一致), pydantic model 和 `BaseModel` 实例转换为 dict.
+
+```python
+app.json = JSONProvider(app)
+```
+
+`python -m app.core.response.benchmark` 对比两者在常见响应上的性能.
+"""
+import dataclasses
+import decimal
+import uuid
+from datetime import date, time
+from typing import TYPE_CHECKING, Any
+
+import pydantic
+from flask.json.provider import DefaultJSONProvider
+from pydantic.json import pydantic_encoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+if TYPE_CHECKING:
+    from flask import Response
+
+
+def default(obj: Any) -> Any:
+    """处理 orjson 和标准库都无法直接编码的类型."""
+    if isinstance(obj, pydantic.BaseModel):
+        return obj.dict()
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        # app.core.model.BaseModel
+        return to_dict()
+    if isinstance(obj, date | time):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal | uuid.UUID):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    return pydantic_encoder(obj)
+
+
+class StdJSONProvider(DefaultJSONProvider):
+    """标准库 json, 没有安装 orjson 时使用."""
+
+    default = staticmethod(default)  # type: ignore
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        return self.dumps(obj).encode()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self.dumps_bytes(obj, **kwargs).decode()
+
+    def dumps_bytes(self, obj: Any, **kwargs: Any) -> bytes:
+        # dataclass 交给 default 处理, BaseModel 需要使用 to_dict (包括 property)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS  # type: ignore
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS  # type: ignore
+        return orjson.dumps(obj, default=default, option=option)  # type: ignore
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)  # type: ignore
+
+    def response(self, *args: Any, **kwargs: Any) -> "Response":
+        # 直接使用 bytes, 省去 decode/encode
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+JSONProvider: type[StdJSONProvider | OrjsonProvider] = StdJSONProvider if orjson is None else OrjsonProvider
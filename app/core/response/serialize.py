@@ -0,0 +1,84 @@
+"""按响应 schema 序列化视图函数的返回值.
+
+`@validate(response=Schema)` 时, 视图函数可以直接返回 ORM 实例、实例列表或 `ResultPageSchema`(items 为 ORM 实例),
+按 schema 的字段投影后一次编码为 JSON bytes, 不经过 `to_dicts` 和 pydantic 的 `.dict()` 复制:
+
+```python
+class UserOut(PydanticModel):
+    id: int
+    username: str
+
+@app.get("/users")
+@validate(response=UserOut)
+def list_users(query: PageSchema) -> ResultPageSchema:
+    rows = User.get_all(query.page, query.count)
+    return ResultPageSchema(page=query.page, count=query.count, total=User.count(), items=rows)
+```
+
+返回值不经过 schema 校验, schema 只用于声明输出哪些字段; 返回 dict(如 `to_dict()` 的结果)时同样按字段投影.
+"""
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import pydantic
+from flask import Response, current_app
+from werkzeug.datastructures import Headers
+
+from app.core.model import BaseModel
+from app.core.schema.common import ResultPageSchema
+
+
+class ResponseSerializer:
+    def __init__(
+        self,
+        schema: type[pydantic.BaseModel] | None = None,
+        include_field: Iterable[str] | None = None,
+        exclude_field: Iterable[str] | None = None,
+    ) -> None:
+        if include_field is None and schema is not None:
+            include_field = schema.__fields__.keys()
+        self.include = frozenset(include_field) if include_field is not None else None
+        self.exclude = frozenset(exclude_field or ())
+
+    def row(self, obj: Any) -> Any:
+        if isinstance(obj, BaseModel):
+            return obj.serializer().dump(obj, self.include, self.exclude)
+        if isinstance(obj, pydantic.BaseModel):
+            return obj.dict(include=self.include, exclude=self.exclude)  # type: ignore
+        if isinstance(obj, dict):
+            return {
+                key: value
+                for key, value in obj.items()
+                if (self.include is None or key in self.include) and key not in self.exclude
+            }
+        return obj
+
+    def rows(self, objs: Sequence[Any]) -> list[Any]:
+        if objs and isinstance(objs[0], BaseModel):
+            # 同一个 model 的列表, 共用一个投影
+            return objs[0].serializer().dump_many(objs, self.include, self.exclude)
+        return [self.row(obj) for obj in objs]
+
+    def content(self, result: Any) -> Any:
+        if isinstance(result, ResultPageSchema):
+            return {"page": result.page, "count": result.count, "total": result.total, "items": self.rows(result.items)}
+        if isinstance(result, list | tuple):
+            return self.rows(result)
+        return self.row(result)
+
+    def response(self, result: Any) -> Any:
+        """视图函数返回 Response 或 (body, status, headers)、(body, status)、(body, headers) 时保持 Flask 的处理方式."""
+        if isinstance(result, Response):
+            return result
+        status = headers = None
+        if isinstance(result, tuple) and len(result) == 3:
+            result, status, headers = result
+        elif isinstance(result, tuple) and len(result) == 2:
+            if isinstance(result[1], Headers | dict | tuple | list):
+                result, headers = result
+            elif isinstance(result[1], int | str):
+                result, status = result
+        provider: Any = current_app.json
+        content = self.content(result)
+        body = provider.dumps_bytes(content) if hasattr(provider, "dumps_bytes") else provider.dumps(content)
+        return current_app.response_class(body, status=status, headers=headers, mimetype="application/json")
@@ -0,0 +1,88 @@
+"""流式导出.
+
+按 `BaseModel.iter_chunks` 分批读取, 每批序列化后立即发送, 不会把整张表加载到内存中:
+
+```python
+from app.core.response import stream_model
+
+@app.get("/users/export")
+def export_users() -> Response:
+    return stream_model(User, "csv", exclude_field={"password"}, is_deleted=0)
+```
+"""
+
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING, Any, Literal
+
+from flask import Response
+from pydantic.json import pydantic_encoder
+
+if TYPE_CHECKING:
+    from app.core.model import BaseModel
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+def iter_ndjson(chunks: Iterable[list[dict[str, Any]]]) -> Iterator[bytes]:
+    """每批数据编码为 NDJSON(每行一个 JSON 对象)."""
+    for rows in chunks:
+        if rows:
+            yield "".join(json.dumps(row, default=pydantic_encoder, ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+def iter_csv(chunks: Iterable[list[dict[str, Any]]], fieldnames: Iterable[str]) -> Iterator[bytes]:
+    """每批数据编码为 CSV, 首先发送表头."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fieldnames), extrasaction="ignore")
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_response(body: Iterable[bytes], mimetype: str, filename: str | None = None) -> Response:
+    response = Response(body, mimetype=mimetype)
+    # 禁止 nginx 缓冲, 使第一批数据立即发送给客户端
+    response.headers["X-Accel-Buffering"] = "no"
+    if filename is not None:
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_model(
+    model: type["BaseModel"],
+    fmt: ExportFormat = "ndjson",
+    *args: Any,
+    include_field: set[str] | None = None,
+    exclude_field: set[str] | None = None,
+    chunk_size: int = 1000,
+    **kwargs: Any,
+) -> Response:
+    """将 model 对应的表以 NDJSON 或 CSV 流式导出.
+
+    Args:
+        model (type[BaseModel]): 导出的 model.
+        fmt (ExportFormat): "ndjson" 或 "csv".
+        *args: 过滤条件, 同 `BaseModel.get_all`.
+        include_field (set[str], optional): 只导出的字段.
+        exclude_field (set[str], optional): 不导出的字段.
+        chunk_size (int): 每批读取的行数.
+        **kwargs: 过滤条件, 同 `BaseModel.get_all`.
+    """
+    serializer = model.serializer()
+    chunks = (
+        serializer.dump_many(rows, include_field, exclude_field)
+        for rows in model.iter_chunks(*args, chunk_size=chunk_size, **kwargs)
+    )
+    filename = f"{model.__tablename__}.{fmt}"
+    if fmt == "csv":
+        fieldnames = serializer.projection(include_field, exclude_field)
+        return stream_response(iter_csv(chunks, fieldnames), "text/csv", filename)
+    return stream_response(iter_ndjson(chunks), "application/x-ndjson", filename)
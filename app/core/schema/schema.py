@@ -1,7 +1,7 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from functools import wraps
 from inspect import get_annotations
-from typing import ParamSpec, TypeVar
+from typing import Any, ParamSpec, TypeVar, overload
 
 from flask import request
 from pydantic import BaseModel, ValidationError
@@ -13,56 +13,125 @@ R = TypeVar("R")
 S = TypeVar("S", bound=BaseModel)
 
 
-def validate(func: Callable[P, R]) -> Callable[P, R]:
-    """参数校验装饰器.
+def _is_schema(annotation: Any) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
 
-    >>> @validate
-        def index(path_param: int, query: QuerySchema, body: BodySchema) -> Response:
-            pass.
-    """
 
-    @wraps(func)
-    def wrapper_validate(*args: P.args, **kwargs: P.kwargs) -> R:
-        # 解析
-        annotations = get_annotations(func)
+def _identity(value: Any) -> Any:
+    return value
+
 
-        query_schema = annotations.get("query")
-        body_schema = annotations.get("body")
+class ValidationPlan:
+    """视图函数的参数校验计划, 装饰时根据类型注解生成一次, 每个请求只执行计划."""
+
+    __slots__ = ("query", "body", "converters")
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        annotations = get_annotations(func)
+        self.query: type[BaseModel] | None = annotations.get("query")
+        self.body: type[BaseModel] | None = annotations.get("body")
         # TODO 暂未实现 annotations.get("form")
+        if self.query is not None and not _is_schema(self.query):
+            raise TypeError(f"{func.__qualname__}: query_schema must be a subclass of BaseModel")
+        if self.body is not None and not _is_schema(self.body):
+            raise TypeError(f"{func.__qualname__}: body_schema must be a subclass of BaseModel")
+        # 路径参数名 -> 转换函数
+        self.converters: dict[str, Callable[[Any], Any]] = {}
+        for name, annotation in annotations.items():
+            if name in ("query", "body", "return"):
+                continue
+            if _is_schema(annotation):
+                self.converters[name] = annotation.validate
+            elif annotation is int:
+                self.converters[name] = int
+            else:
+                self.converters[name] = _identity
 
-        if query_schema is not None:
-            if not isinstance(query_schema, type) or not issubclass(query_schema, BaseModel):
-                raise Exception("query_schema must be a subclass of BaseModel")
+    def apply(self, kwargs: dict[str, Any]) -> None:
+        if self.query is not None:
             try:
-                data = query_schema.validate(request.args.to_dict())
-                kwargs["query"] = data
+                kwargs["query"] = self.query.validate(request.args.to_dict())
             except ValidationError as e:
                 raise ParameterException(errors=e.errors()) from None
-        if body_schema is not None:
-            if not isinstance(body_schema, type) or not issubclass(body_schema, BaseModel):
-                raise Exception("body_schema must be a subclass of BaseModel")
+        if self.body is not None:
             try:
-                data = body_schema.validate(request.get_json())
-                kwargs["body"] = data
+                kwargs["body"] = self.body.validate(request.get_json())
             except ValidationError as e:
                 raise ParameterException(errors=e.errors()) from None
-        if request.view_args is not None:
+        if self.converters and request.view_args is not None:
             for key, value in request.view_args.items():
-                path_param_schema = annotations.get(key)
-                if path_param_schema is not None:
-                    try:
-                        if issubclass(path_param_schema, BaseModel):
-                            data = path_param_schema.validate(value)
-                        elif path_param_schema is int:
-                            data = int(value)
-                        else:
-                            data = value
-                        kwargs[key] = data
-                    except ValidationError as e:
-                        raise ParameterException(errors=e.errors()) from None
-                    except ValueError as e:
-                        raise ParameterException(message=str(e)) from None
-                    request.view_args[key] = data
-        return func(*args, **kwargs)
-
-    return wrapper_validate
+                converter = self.converters.get(key)
+                if converter is None:
+                    continue
+                try:
+                    data = converter(value)
+                except ValidationError as e:
+                    raise ParameterException(errors=e.errors()) from None
+                except ValueError as e:
+                    raise ParameterException(message=str(e)) from None
+                kwargs[key] = data
+                request.view_args[key] = data
+
+
+@overload
+def validate(func: Callable[P, R]) -> Callable[P, R]:
+    ...
+
+
+@overload
+def validate(
+    *,
+    response: type[BaseModel] | None = None,
+    include_field: Iterable[str] | None = None,
+    exclude_field: Iterable[str] | None = None,
+) -> Callable[[Callable[P, R]], Callable[P, Any]]:
+    ...
+
+
+def validate(
+    func: Callable[P, R] | None = None,
+    *,
+    response: type[BaseModel] | None = None,
+    include_field: Iterable[str] | None = None,
+    exclude_field: Iterable[str] | None = None,
+) -> Callable[[Callable[P, R]], Callable[P, Any]] | Callable[P, R]:
+    """参数校验装饰器.
+
+    Args:
+        func (Callable, optional): 视图函数.
+        response (type[BaseModel], optional): 响应 schema, 返回值按其字段投影后直接编码为 JSON,
+            见 `app.core.response.serialize`.
+        include_field (Iterable[str], optional): 只输出的字段, 默认为 response 的字段.
+        exclude_field (Iterable[str], optional): 排除的字段.
+
+    >>> @validate
+        def index(path_param: int, query: QuerySchema, body: BodySchema) -> Response:
+            pass.
+    >>> @validate(response=UserOut)
+        def detail(user_id: int) -> User:
+            return User.get_by_id(user_id).
+    """
+
+    def decorator_validate(func: Callable[P, R]) -> Callable[P, Any]:
+        plan = ValidationPlan(func)
+        serializer = None
+        if response is not None or include_field is not None or exclude_field is not None:
+            # 延迟导入: response 包依赖 model, 避免导入 schema 时加载数据库模块
+            from app.core.response.serialize import ResponseSerializer
+
+            serializer = ResponseSerializer(response, include_field, exclude_field)
+
+        @wraps(func)
+        def wrapper_validate(*args: P.args, **kwargs: P.kwargs) -> Any:
+            plan.apply(kwargs)
+            result = func(*args, **kwargs)
+            if serializer is not None:
+                return serializer.response(result)
+            return result
+
+        return wrapper_validate
+
+    if func is not None:
+        return decorator_validate(func)
+
+    return decorator_validate
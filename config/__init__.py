@@ -70,6 +70,14 @@ class TaskConfig(BaseSettings):
     broker_pool_limit: int = 0
     broker_connection_retry_on_startup: bool = True
 
+    #### beat
+    beat_schedule: dict[str, Any] = Field(
+        default_factory=lambda: {
+            # 计数器增量写回数据库
+            "flush-counters": {"task": "low_priority:flush_counters", "schedule": timedelta(seconds=10)},
+        }
+    )
+
     #### worker
     # worker 接受的内容类型
     accept_content: list[str] = Field(default_factory=lambda: ["json"])
@@ -100,16 +108,34 @@ class BaseConfig(BaseSettings):
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
     JWT_TOKEN_URL: str = "/api/v1/auth/login"
     JWT_ALGORITHM: str = "HS256"
+    JWT_TOKEN_CACHE_SIZE: int = 10000
+
+    # 启动时删除代码中已经不存在的权限
+    PERMISSION_SYNC_PRUNE: bool = False
 
     # DB
     DB_URL: str
     DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP: int = 2
+    DB_METRICS_URL: str | None = None
+    DB_METRICS_ALLOWED_IPS: list[str] = ["127.0.0.1", "::1"]
+    # 分片名 -> 数据库 url, JSON 格式
+    DB_SHARDS: dict[str, str] = {}
     DB_ECHO: bool = False
+    DB_N_PLUS_ONE_THRESHOLD: int = 5
 
     # redis
     REDIS_PASSWORD: str
     REDIS_URL: str
 
+    # 查询缓存
+    QUERY_CACHE_TTL: int = 300
+    QUERY_CACHE_STORAGES: list[str] = ["local", "redis"]
+
     # log
     LOG_LEVEL: str = "INFO"
 
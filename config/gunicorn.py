@@ -1,4 +1,5 @@
 import os
+from typing import Any
 
 from app.core.log import GunicornLogger, configure_structlog
 from config import config as base_config  # config 名称有冲突
@@ -17,3 +18,20 @@ chdir = "/home/appuser"
 
 # Logging
 logger_class = GunicornLogger
+
+
+def post_worker_init(worker: Any) -> None:
+    """Worker 加载 app 后预先建立数据库连接, 首批请求不需要等待建立连接; 同步权限声明(只有一个 worker 执行)."""
+    from redis.exceptions import RedisError
+    from sqlalchemy.exc import SQLAlchemyError
+
+    from app.core.auth.sync import sync_permissions
+    from app.core.model import db
+    from app.core.redis import redis_client
+
+    db.warm_up()
+    try:
+        sync_permissions(redis_client, prune=base_config.PERMISSION_SYNC_PRUNE)
+    except (RedisError, SQLAlchemyError):
+        # 同步失败不影响 worker 启动, 下次启动时重试
+        worker.log.exception("Permission sync failed")
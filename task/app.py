@@ -18,3 +18,4 @@ app.set_default()
 
 # import task.example  # noqa # type: ignore[import]
 import sms.tasks  # noqa # type: ignore[import]
+import task.counter  # noqa # type: ignore[import]
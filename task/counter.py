@@ -0,0 +1,17 @@
+from celery.utils.log import get_task_logger
+
+# 导入 flask app 以初始化数据库连接和 Counter 的 redis client
+import app.app
+import app.core.auth.model  # noqa: F401 注册 User 上的计数器
+from app.core.model import Counter
+from task.app import app as celery_app
+
+logger = get_task_logger(__name__)
+
+
+@celery_app.task(name="low_priority:flush_counters", ignore_result=True)
+def flush_counters() -> None:
+    """将 redis 中累计的计数增量批量写回数据库."""
+    for key, rows in Counter.flush_all().items():
+        if rows:
+            logger.info("flush %s: %s rows", key, rows)
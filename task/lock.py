@@ -108,6 +108,10 @@ class RenewLock:
         self.renew_thread = None
         # 用于停止续约线程
         self.stop_renewing = threading.Event()
+        # 续约失败时设置: 锁已被其他客户端持有, 或者在过期前无法续约
+        self.lost = threading.Event()
+        # 锁在此时间(monotonic)之前有效
+        self.valid_until = 0.0
         self._lock = Lock(self.key, self.value, self.expiration, self.redis_client)
 
     def renew_lock(self, expiration: timedelta | None = None) -> bool:
@@ -161,6 +165,7 @@ class RenewLock:
             # 加锁失败
             return False
 
+        self.valid_until = time.monotonic() + (expiration or self.expiration).total_seconds()
         # 已经获取锁,开始一个后台线程来自动续约
         self.renew_thread = threading.Thread(target=self._renew_lock_task)
         # 设置为守护线程,主线程退出后自动退出
@@ -177,18 +182,28 @@ class RenewLock:
             self.renew_thread = None
         return self._lock.release()
 
+    def is_held(self) -> bool:
+        """是否仍然持有锁: 续约没有失败, 且没有超过最后一次续约的有效期."""
+        return not self.lost.is_set() and time.monotonic() < self.valid_until
+
     def _renew_lock_task(self) -> None:
         """Background thread to renew the lock periodically."""
-        while not self.stop_renewing.is_set():
-            # 经过过期时间的一半后续约
-            time.sleep(self.expiration.total_seconds() / 2)
+        # 每经过过期时间的三分之一续约, 失败时在过期前还有一次重试机会
+        while not self.stop_renewing.wait(self.expiration.total_seconds() / 3):
+            start = time.monotonic()
             try:
-                # 重新判断是否需要续约
-                if not self.stop_renewing.is_set():
-                    self.renew_lock()
-            except redis.exceptions.RedisError:
-                # TODO 续约失败,需要处理
+                self.renew_lock()
+            except LockNotHoldError:
+                # 锁已过期或被其他客户端持有
+                self.lost.set()
                 break
+            except ServerError:
+                if time.monotonic() >= self.valid_until:
+                    self.lost.set()
+                    break
+                # 锁还没有过期, 下次重试
+                continue
+            self.valid_until = start + self.expiration.total_seconds()
 
     def __enter__(self) -> Self:
         if self.acquire_with_renew():
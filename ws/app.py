@@ -14,6 +14,13 @@ from celery.signals import task_postrun
 from pydantic import BaseModel, ValidationError
 from websockets.server import WebSocketServerProtocol, serve
 
+from app.app import app as flask_app
+from app.core.auth import Auth, User
+from app.core.auth.auth import verify_access_token
+from app.core.exception import Unauthorized
+from app.core.model import async_db
+from config import config
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -23,7 +30,6 @@ logging.basicConfig(
 R = TypeVar("R", bound=BaseModel)
 
 CLIENTS: set[WebSocketServerProtocol] = set()
-USERS = {"123": "xiao"}
 
 ROOMS: dict[str, "Room"] = {}
 
@@ -57,9 +63,19 @@ class TokenEvent(Event):
     data: str
 
 
-def get_user(token: str) -> str | None:
-    """获得当前用户."""
-    return USERS.get(token)
+async def get_user(token: str) -> User | None:
+    """根据 JWT 获得当前用户, 直接使用异步数据库查询.
+
+    与 HTTP 认证使用相同的 JWT 配置并检查是否已被吊销, 吊销检查会访问 redis, 在线程中执行.
+    """
+    try:
+        payload = await asyncio.to_thread(verify_access_token, token, flask_app)
+    except Unauthorized:
+        return None
+    user = await User.aget_by_id(payload["sub"]["user_id"])
+    if user is None or user.is_deleted:
+        return None
+    return user
 
 
 async def parse_event(websocket: WebSocketServerProtocol, model: type[R]) -> R | None:
@@ -79,11 +95,11 @@ async def handler(websocket: WebSocketServerProtocol) -> None:
         # 首次进入必须传递 token
         return
     # 判断 user
-    user = await asyncio.to_thread(get_user, data.data)  # 将同步函数转换为异步函数
+    user = await get_user(data.data)
     if user is None:
         await websocket.close(1011, "authentication failed")
         return
-    logging.info(user)
+    logging.info("user %s connected", user.id)
 
     # 加入客户端列表
     CLIENTS.add(websocket)
@@ -132,6 +148,10 @@ async def main(port: int = 8765) -> None:
     loop.add_signal_handler(signal.SIGINT, stop.set_result, None)
     loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
 
+    # JWT 配置与 HTTP 服务相同
+    Auth.config(flask_app)
+    async_db.init(config.DB_URL, pool_size=config.DB_POOL_SIZE, echo=config.DB_ECHO)
+
     async with serve(
         handler,
         "localhost",
@@ -148,6 +168,7 @@ async def main(port: int = 8765) -> None:
     ):
         logging.info("Running server on port %s", port)
         await stop
+        await async_db.dispose()
         logging.info("exit")
 
 